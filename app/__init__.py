@@ -3,17 +3,52 @@ from flask_jwt_extended import JWTManager
 import os
 from dotenv import load_dotenv
 from flask_cors import CORS
+from functools import wraps
+import inspect
 load_dotenv()
 
 
+class App(Flask):
+    """
+    Runs `async def` views on the worker's long-lived runtime loop
+    (instead of Flask's default fresh loop per call), in WSGI and ASGI
+    modes alike.
+    """
+
+    def ensure_sync(self, func):
+        if not inspect.iscoroutinefunction(func):
+            return func
+
+        from app.runtime import runtime
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return runtime.run(func(*args, **kwargs))
+
+        return wrapper
+
+
 def create_app():
-    app = Flask(__name__)
+    app = App(__name__)
+
+    # ObjectId/datetime/BSON aware, orjson-backed when available
+    from app.json_provider import json_provider_class
+    app.json = json_provider_class()(app)
 
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     if not app.config["JWT_SECRET_KEY"]:
         raise RuntimeError("JWT_SECRET_KEY not set")
 
-    JWTManager(app)
+    jwt = JWTManager(app)
+
+    # Tokenizer download/load off the request path
+    from app.ai import tokens
+    tokens.warm()
+
+    # Lifetimes, refresh rotation and the revocation check
+    from app.auth import init_tokens
+    init_tokens(app, jwt)
+
     CORS(
     app,
     resources={
@@ -26,6 +61,7 @@ def create_app():
     },
     supports_credentials=True, 
     allow_headers=["Authorization", "Content-Type"],
+    expose_headers=["X-Next-Cursor"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
     from app.auth import auth_bp
@@ -43,6 +79,22 @@ def create_app():
     from app.submissions import submissions_bp
     app.register_blueprint(submissions_bp, url_prefix="/submissions")
 
+    from app.metrics import metrics_bp
+    app.register_blueprint(metrics_bp, url_prefix="/metrics")
+
+    from app.health import health_bp
+    app.register_blueprint(health_bp, url_prefix="/health")
+
+    from app.indexes import indexes_cli
+    app.cli.add_command(indexes_cli)
+
+    from app.bench import bench_cli
+    app.cli.add_command(bench_cli)
+
+    # Start (or, after fork, restart) this worker's job runner lazily
+    from app.job_service import worker
+    app.before_request(worker.ensure_started)
+
 
 
 
@@ -1,15 +1,32 @@
 from dotenv import load_dotenv
+from contextlib import AsyncExitStack
+import json
 import os
-import httpx
+
+from app.ai.cache import LLM_CACHE_ENABLED, cache_key, response_cache
+from app.ai.client import get_client, close_client
+from app.ai.resilience import call_with_retry, error_for, model_slot
+from app.ai import tokens
+from app.runtime import runtime
 
 load_dotenv()
 
+# Close pooled LLM connections when the worker shuts down
+runtime.on_shutdown(close_client)
+
+CONTINUE_PROMPT = (
+    "Your previous answer was cut off. Continue it from exactly where it "
+    "stopped. Output ONLY the remaining characters: do not repeat anything "
+    "already written and do not use markdown."
+)
+
 
 class Agent:
     """
     Generic async LLM agent.
     Responsible ONLY for:
-    - sending prompts
+    - sending prompts (with retries, circuit breaking and per-model
+      concurrency limits from app.ai.resilience)
     - returning raw text output
 
     It does NOT:
@@ -18,26 +35,89 @@ class Agent:
     - modify responses
     """
 
-    def __init__(self, name: str, model: str, system_prompt: str):
+    def __init__(self, name: str, model: str, system_prompt: str, temperature: float = 0.2):
         self.name = name
         self.model = model
         self.system_prompt = system_prompt
+        # Low temperature = deterministic JSON
+        self.temperature = temperature
 
-        self.api_key = os.getenv("LLM_API_KEY")
-        self.base_url = os.getenv("LLM_BASE_URL")
+    # Read on use rather than at construction: agents are module-level
+    # singletons, and importing them must not require LLM settings
 
-        if not self.api_key:
+    @property
+    def api_key(self) -> str:
+        api_key = os.getenv("LLM_API_KEY")
+        if not api_key:
             raise RuntimeError("LLM_API_KEY not set in environment")
+        return api_key
 
-        if not self.base_url:
+    @property
+    def base_url(self) -> str:
+        base_url = os.getenv("LLM_BASE_URL")
+        if not base_url:
             raise RuntimeError("LLM_BASE_URL not set in environment")
+        return base_url
+
+    def cache_key(self, user_prompt: str) -> str:
+        return cache_key(self.model, self.system_prompt, self.temperature, user_prompt)
 
-    async def run(self, user_prompt: str) -> str:
+    async def run(self, user_prompt: str, bypass_cache: bool = False) -> str:
         """
         Sends prompt to the LLM and returns RAW response text.
         Caller is responsible for parsing / validation.
+
+        Identical requests are answered from the response cache unless
+        `bypass_cache` is set (a fresh answer still refreshes the cache).
+        """
+
+        key = self.cache_key(user_prompt)
+
+        if LLM_CACHE_ENABLED and not bypass_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        async with model_slot(self.model):
+            content = await call_with_retry(
+                self.base_url,
+                lambda: self._complete(user_prompt)
+            )
+
+        if LLM_CACHE_ENABLED:
+            await response_cache.set(key, content)
+
+        return content
+
+    async def forget(self, user_prompt: str):
+        """
+        Evicts the cached response for a prompt the caller could not use.
+        """
+
+        if LLM_CACHE_ENABLED:
+            await response_cache.discard(self.cache_key(user_prompt))
+
+    async def remember(self, user_prompt: str, content: str):
+        """
+        Replaces the cached response, e.g. with a repaired version of it.
+        """
+
+        if LLM_CACHE_ENABLED:
+            await response_cache.set(self.cache_key(user_prompt), content)
+
+    async def continue_from(self, user_prompt: str, partial: str) -> str:
+        """
+        Asks the model to finish an answer that was cut off and returns
+        ONLY the missing text. Not cached on its own.
         """
 
+        async with model_slot(self.model):
+            return await call_with_retry(
+                self.base_url,
+                lambda: self._complete(user_prompt, partial)
+            )
+
+    def _request(self, user_prompt: str, stream: bool = False, partial: str = None):
         payload = {
             "model": self.model,
             "messages": [
@@ -50,32 +130,126 @@ class Agent:
                     "content": user_prompt.strip()
                 }
             ],
-            # Low temperature = deterministic JSON
-            "temperature": 0.2
+            "temperature": self.temperature
         }
 
+        if partial is not None:
+            payload["messages"] += [
+                {
+                    "role": "assistant",
+                    "content": partial
+                },
+                {
+                    "role": "user",
+                    "content": CONTINUE_PROMPT
+                }
+            ]
+
+        if stream:
+            payload["stream"] = True
+
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            response = await client.post(
-                self.base_url, # type: ignore
-                json=payload,
-                headers=headers
-            )
+        return payload, headers
+
+    def _record_usage(self, payload, content, usage=None):
+        # Provider-reported usage when available, local counts otherwise
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or sum(
+            tokens.count_tokens(m["content"]) for m in payload["messages"]
+        )
+        completion_tokens = usage.get("completion_tokens") or tokens.count_tokens(content)
+        tokens.record(self.name, prompt_tokens, completion_tokens)
+
+    async def _complete(self, user_prompt: str, partial: str = None) -> str:
+        payload, headers = self._request(user_prompt, partial=partial)
+
+        # Shared keep-alive pool: no new TCP/TLS handshake per call
+        client = get_client()
+        response = await client.post(
+            self.base_url, # type: ignore
+            json=payload,
+            headers=headers
+        )
 
         if response.status_code != 200:
-            raise RuntimeError(
-                f"LLM request failed "
-                f"(status={response.status_code}): {response.text}"
-            )
+            raise error_for(response.status_code, response.text, response.headers)
 
         data = response.json()
 
         # OpenAI / Groq compatible response format
         try:
-            return data["choices"][0]["message"]["content"].strip()
+            content = data["choices"][0]["message"]["content"]
         except (KeyError, IndexError):
             raise RuntimeError(f"Unexpected LLM response format: {data}")
+
+        self._record_usage(payload, content, data.get("usage"))
+
+        # A continuation may resume mid-string: keep its whitespace
+        return content if partial is not None else content.strip()
+
+    async def stream(self, user_prompt: str, bypass_cache: bool = False):
+        """
+        Async generator yielding RAW text fragments as the model produces
+        them (OpenAI-compatible `stream: true` server-sent chunks).
+
+        A cached response is yielded as a single fragment; a completed
+        stream is stored in the cache like run() would.
+        """
+
+        key = self.cache_key(user_prompt)
+
+        if LLM_CACHE_ENABLED and not bypass_cache:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        payload, headers = self._request(user_prompt, stream=True)
+        parts = []
+
+        client = get_client()
+
+        async def _open(stack):
+            response = await stack.enter_async_context(client.stream(
+                "POST",
+                self.base_url, # type: ignore
+                json=payload,
+                headers=headers
+            ))
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", "replace")
+                await response.aclose()
+                raise error_for(response.status_code, body, response.headers)
+            return response
+
+        # Only opening the stream is retried: once text has been yielded
+        # a failure is surfaced to the caller
+        async with model_slot(self.model), AsyncExitStack() as stack:
+            response = await call_with_retry(self.base_url, lambda: _open(stack))
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                try:
+                    delta = json.loads(data)["choices"][0].get("delta", {})
+                except (ValueError, KeyError, IndexError):
+                    raise RuntimeError(f"Unexpected LLM stream chunk: {data}")
+
+                content = delta.get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+
+        self._record_usage(payload, "".join(parts))
+
+        if LLM_CACHE_ENABLED:
+            await response_cache.set(key, "".join(parts).strip())
@@ -0,0 +1,190 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app import metrics
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MONGO = os.getenv("LLM_CACHE_MONGO", "0") == "1"
+
+
+def cache_key(model: str, system_prompt: str, temperature: float, user_prompt: str) -> str:
+    """
+    Content address of an LLM request.
+    """
+
+    material = json.dumps(
+        [model, system_prompt.strip(), temperature, user_prompt.strip()],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for raw LLM responses.
+
+    - L1: in-process LRU, bounded by entry count and total bytes, with TTL
+    - L2 (optional): MongoDB `llm_cache` collection shared by all workers,
+      expired by a TTL index on `expiresAt`
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl, use_mongo=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.use_mongo = use_mongo
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "hits": 0,
+            "sharedHits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stores": 0
+        }
+
+    # ---------- L1 ----------
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.stats["expirations"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def _put_local(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def _count(self, name):
+        # Counters share the entries' lock: workers' threads update them concurrently
+        with self._lock:
+            self.stats[name] += 1
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value.encode("utf-8"))
+
+    # ---------- L2 ----------
+
+    async def _get_shared(self, key):
+        from app import async_db
+
+        doc = await async_db.llm_cache_col.find_one({
+            "_id": key,
+            "expiresAt": {"$gt": datetime.utcnow()}
+        })
+        return doc["response"] if doc else None
+
+    async def _put_shared(self, key, value):
+        from app import async_db
+
+        # TTL index on expiresAt is declared in app.db.INDEXES
+        await async_db.llm_cache_col.update_one(
+            {"_id": key},
+            {"$set": {
+                "response": value,
+                "expiresAt": datetime.utcnow() + timedelta(seconds=self.ttl)
+            }},
+            upsert=True
+        )
+
+    async def _delete_shared(self, key):
+        from app import async_db
+
+        await async_db.llm_cache_col.delete_one({"_id": key})
+
+    # ---------- public ----------
+
+    async def get(self, key):
+        value = self._get_local(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.use_mongo:
+            value = await self._get_shared(key)
+            if value is not None:
+                self._count("sharedHits")
+                self._put_local(key, value)
+                return value
+
+        self._count("misses")
+        return None
+
+    async def set(self, key, value):
+        self._put_local(key, value)
+        self._count("stores")
+
+        if self.use_mongo:
+            await self._put_shared(key, value)
+
+    async def discard(self, key):
+        """
+        Drops a cached response, e.g. when the caller could not parse it.
+        """
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+        if self.use_mongo:
+            await self._delete_shared(key)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "shared": self.use_mongo
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+    ttl=LLM_CACHE_TTL,
+    use_mongo=LLM_CACHE_MONGO
+)
+
+metrics.register("llmCache", response_cache.snapshot)
@@ -0,0 +1,75 @@
+from dotenv import load_dotenv
+import asyncio
+import os
+import weakref
+import httpx
+
+load_dotenv()
+
+# HTTP/2 needs the optional `h2` package (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "10"))
+
+
+# httpx connections are bound to the event loop that opened them,
+# so keep one pooled client per loop (normally just the runtime loop)
+_clients = weakref.WeakKeyDictionary()
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            connect=LLM_CONNECT_TIMEOUT,
+            read=LLM_READ_TIMEOUT,
+            write=LLM_WRITE_TIMEOUT,
+            pool=LLM_POOL_TIMEOUT
+        )
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the shared, connection-pooled LLM client for the running loop.
+    Must be called from inside a coroutine.
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[loop] = client
+
+    return client
+
+
+async def close_client():
+    """
+    Closes the pooled client of the running loop (if any).
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+
+    if client is not None and not client.is_closed:
+        await client.aclose()
@@ -0,0 +1,113 @@
+import ast
+import io
+import re
+import tokenize
+
+from app.ai.tokens import count_tokens
+
+# Lines that declare something: kept in outlines of oversized code
+SIGNATURE = re.compile(
+    r"^\s*(@|async\s+def\b|def\b|class\b|function\b|export\b|import\b|from\b.*\bimport\b|"
+    r"public\b|private\b|protected\b|static\b|func\b|fn\b|interface\b|struct\b|"
+    r"(const|let|var)\s+\w+\s*=\s*(async\s*)?(\(|function\b))"
+)
+BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+LINE_COMMENT = re.compile(r"^\s*(//|#(\s|$))")
+
+
+def _strip_python(code: str):
+    """
+    Drops comments via the tokenizer (never touches strings).
+    None when the code is not valid Python.
+    """
+
+    try:
+        ast.parse(code)
+        toks = [
+            tok for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type != tokenize.COMMENT
+        ]
+        return tokenize.untokenize(toks)
+    except (SyntaxError, ValueError, tokenize.TokenError):
+        return None
+
+
+def _strip_generic(code: str) -> str:
+    code = BLOCK_COMMENT.sub("", code)
+    return "\n".join(line for line in code.splitlines() if not LINE_COMMENT.match(line))
+
+
+def compact_code(code: str) -> str:
+    """
+    Comments, blank lines and trailing whitespace removed; everything
+    else is left as written.
+    """
+
+    stripped = _strip_python(code)
+    if stripped is None:
+        stripped = _strip_generic(code)
+
+    return "\n".join(
+        line.rstrip() for line in stripped.splitlines() if line.strip()
+    )
+
+
+def outline(code: str, max_tokens: int) -> str:
+    """
+    Signature lines only (defs, classes, imports, decorators), cut to
+    `max_tokens`.
+    """
+
+    lines = []
+    used = 0
+
+    for line in code.splitlines():
+        if not SIGNATURE.match(line):
+            continue
+
+        used += count_tokens(line) + 1
+        if used > max_tokens:
+            lines.append("...")
+            break
+        lines.append(line.rstrip())
+
+    return "\n".join(lines)
+
+
+def split_chunks(code: str, max_tokens: int) -> list:
+    """
+    Splits code into pieces of at most `max_tokens`, preferring to cut
+    before an unindented line (a top-level definition) over mid-block.
+    """
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    boundary = None    # index in `current` of the last top-level line
+
+    def flush(upto):
+        nonlocal current, current_tokens, boundary
+        head, current = current[:upto], current[upto:]
+        chunks.append("\n".join(head))
+        current_tokens = sum(count_tokens(line) + 1 for line in current)
+        boundary = max(
+            (i for i, line in enumerate(current) if i and line[:1].strip()),
+            default=None
+        )
+
+    for line in code.splitlines():
+        size = count_tokens(line) + 1
+
+        while current and current_tokens + size > max_tokens:
+            flush(boundary or len(current))
+
+        if line[:1].strip() and current:
+            boundary = len(current)
+
+        current.append(line)
+        current_tokens += size
+
+    if current:
+        flush(len(current))
+
+    return chunks
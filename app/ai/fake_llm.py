@@ -0,0 +1,137 @@
+"""
+OpenAI-compatible stand-in for the LLM provider, for benchmarks and
+tests. Serves chat completions (plain and `stream: true`) from a
+background thread on 127.0.0.1; the app itself never uses it.
+
+Failures are scripted per request:
+
+    with FakeLLM(reply="ok") as fake:
+        fake.fail(503, times=2)                        # then answers normally
+        fake.fail(429, headers={"Retry-After": "1"})
+        fake.stall(5)                                  # next answer 5s late
+"""
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+
+class FakeLLM:
+    """
+    `reply` is the completion text, or a callable building it from the
+    request payload; every answer is delayed by `latency` seconds.
+    """
+
+    def __init__(self, reply="{}", latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Client (host, port) pairs seen: one per TCP connection opened
+        self.connections = set()
+        self._script = deque()  # per-request overrides: (status, headers, delay)
+        self._server = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def fail(self, status, times=1, headers=None):
+        """Answers the next `times` requests with `status`."""
+
+        with self._lock:
+            self._script.extend([(status, headers or {}, 0.0)] * times)
+
+    def stall(self, seconds, times=1):
+        """Answers the next `times` requests normally, `seconds` late."""
+
+        with self._lock:
+            self._script.extend([(200, {}, seconds)] * times)
+
+    def _next_step(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return self._script.popleft() if self._script else (200, {}, 0.0)
+
+    def _send(self, handler, status, headers, body, content_type="application/json"):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _answer(self, handler, payload, status, headers):
+        if status != 200:
+            body = json.dumps({"error": {"message": f"fake {status}"}}).encode()
+            self._send(handler, status, headers, body)
+            return
+
+        content = self.reply(payload) if callable(self.reply) else self.reply
+
+        if payload.get("stream"):
+            chunks = [
+                "data: " + json.dumps({"choices": [{"delta": {"content": content}}]}),
+                "data: [DONE]"
+            ]
+            body = ("\n\n".join(chunks) + "\n\n").encode()
+            self._send(handler, 200, headers, body, "text/event-stream")
+            return
+
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": content}}]
+        }).encode()
+        self._send(handler, 200, headers, body)
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                with fake._lock:
+                    fake.connections.add(self.client_address)
+                status, headers, delay = fake._next_step()
+
+                try:
+                    if fake.latency or delay:
+                        time.sleep(fake.latency + delay)
+                    fake._answer(self, payload, status, headers)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (timeout): nothing left to answer
+                    pass
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,14 +1,41 @@
-import json
+from dotenv import load_dotenv
+import asyncio
+import os
+
+from app import metrics
 from app.ai.agent import Agent
+from app.ai.compaction import compact_code, outline, split_chunks
+from app.ai.json_repair import parse_agent_json
+from app.ai.tokens import count_tokens
+from app.schemas import AI_FEEDBACK
 
-# Instantiate agent once (singleton-style)
-feedback_agent = Agent(
-    name="context_aware_code_feedback_agent",
-    model="llama-3.3-70b-versatile",
-    system_prompt="""
-You are an execution-only code evaluation and feedback agent.
+load_dotenv()
+
+# Code tokens sent as-is; larger submissions are compacted, then split
+FEEDBACK_CODE_BUDGET = int(os.getenv("FEEDBACK_CODE_BUDGET", "6000"))
+FEEDBACK_CHUNK_TOKENS = int(os.getenv("FEEDBACK_CHUNK_TOKENS", "4000"))
+# Parts evaluated per submission; code past the last part only appears in the outline
+FEEDBACK_MAX_CHUNKS = int(os.getenv("FEEDBACK_MAX_CHUNKS", "6"))
+FEEDBACK_OUTLINE_TOKENS = int(os.getenv("FEEDBACK_OUTLINE_TOKENS", "800"))
+# Items kept per feedback key when merging parts
+FEEDBACK_MAX_ITEMS = int(os.getenv("FEEDBACK_MAX_ITEMS", "8"))
+# Program output quoted from the sandbox run
+FEEDBACK_OUTPUT_CHARS = int(os.getenv("FEEDBACK_OUTPUT_CHARS", "1000"))
+
+FEEDBACK_KEYS = ["strengths", "weaknesses", "improvements", "recommendedNextSteps"]
 
-CRITICAL RULES (NON-NEGOTIABLE):
+stats = {
+    "submissions": 0,
+    "compacted": 0,
+    "chunked": 0,
+    "parts": 0,
+    "partsOmitted": 0,
+    "codeTokensIn": 0,
+    "codeTokensSent": 0
+}
+
+# Prompt building blocks, shared with batched evaluation (app/ai/feedback_batch.py)
+FEEDBACK_OUTPUT_RULES = """CRITICAL RULES (NON-NEGOTIABLE):
 - Output MUST be VALID JSON
 - Do NOT use markdown
 - Do NOT wrap output in ``` or ```json
@@ -17,14 +44,9 @@ CRITICAL RULES (NON-NEGOTIABLE):
 - Output ONLY a JSON object
 - If evaluation cannot be performed, output an EMPTY JSON object: {}
 
-INPUT CONTEXT:
-- You will receive:
-  1) the task description
-  2) the submitted source code
-- Evaluate the code strictly against the task description
-- Do NOT assume requirements that are not stated in the task
+"""
 
-EVALUATION PRINCIPLES:
+FEEDBACK_EVALUATION_RULES = """EVALUATION PRINCIPLES:
 - Check whether the code fulfills all requirements in the task description
 - Evaluate correctness, completeness, structure, readability, and best practices
 - Identify missing functionality relative to the task
@@ -36,81 +58,201 @@ FEEDBACK QUALITY RULES:
 - improvements: list exact changes needed to better satisfy the task
 - recommendedNextSteps: suggest specific skills or tasks based on gaps found
 
-REQUIRED OUTPUT KEYS:
-- strengths
-- weaknesses
-- improvements
-- recommendedNextSteps
+"""
 
-FIELD CONSTRAINTS:
+FEEDBACK_FIELD_RULES = """FIELD CONSTRAINTS:
 - All fields MUST be arrays
 - Arrays MUST contain non-empty strings
 - No extra keys
 - No empty arrays
 
-You ONLY output the final JSON object.
+"""
+
+# Instantiate agent once (singleton-style)
+feedback_agent = Agent(
+    name="context_aware_code_feedback_agent",
+    model="llama-3.3-70b-versatile",
+    system_prompt="""
+You are an execution-only code evaluation and feedback agent.
+
+""" + FEEDBACK_OUTPUT_RULES + """INPUT CONTEXT:
+- You will receive:
+  1) the task description
+  2) the submitted source code
+  3) when available, the results of actually running the code
+- Evaluate the code strictly against the task description
+- Execution results are facts: do not contradict a reported error or output
+- Name checks in the execution results are derived from the task text and may be approximate
+- Do NOT assume requirements that are not stated in the task
+
+""" + FEEDBACK_EVALUATION_RULES + """REQUIRED OUTPUT KEYS:
+- strengths
+- weaknesses
+- improvements
+- recommendedNextSteps
+
+""" + FEEDBACK_FIELD_RULES + """You ONLY output the final JSON object.
 """
 )
 
-async def generate_feedback(payload: dict) -> dict:
+def _prompt(task_description: str, code: str, part: str = "", execution: str = "") -> str:
+    return f"""
+TASK DESCRIPTION:
+{task_description}
+{part}
+SUBMITTED CODE:
+{code}
+{execution}"""
+
+
+def execution_summary(grading) -> str:
     """
-    Expected payload:
-    {
-        "taskDescription": "string",
-        "submittedCode": "string"
-    }
+    The sandbox result (app.sandbox.grade) as prompt text.
     """
 
-    prompt = f"""
-TASK DESCRIPTION:
-{payload.get("taskDescription", "")}
+    if not grading:
+        return ""
 
-SUBMITTED CODE:
-{payload.get("submittedCode", "")}
-
-OUTPUT:
-{{
-  "strengths": [],
-  "weaknesses": [],
-  "improvements": [],
-  "recommendedNextSteps": []
-}}
-"""
+    lines = [
+        "",
+        f"EXECUTION RESULTS ({grading.get('language', 'unknown')}, automated run):",
+        f"status: {grading['status']}"
+    ]
+    if grading.get("error"):
+        lines.append(f"error:\n{grading['error']}")
+    for check in grading.get("checks", []):
+        lines.append(f"check {check['check']}: {'passed' if check['passed'] else 'FAILED'}")
+    if grading.get("stdout"):
+        lines.append(f"output:\n{grading['stdout'][:FEEDBACK_OUTPUT_CHARS]}")
+
+    return "\n".join(lines) + "\n"
 
-    raw = await feedback_agent.run(prompt)
 
-    if not raw or not raw.strip():
-        raise RuntimeError("AI returned empty response")
+def build_feedback_prompts(payload: dict) -> list:
+    """
+    One prompt when the code fits FEEDBACK_CODE_BUDGET (after stripping
+    comments and blank lines if needed); otherwise one prompt per part,
+    each carrying an outline of the whole file for context.
+    """
 
-    raw = raw.strip()
+    task_description = payload.get("taskDescription", "")
+    code = payload.get("submittedCode", "")
+    execution = execution_summary(payload.get("execution"))
 
-    # Guard: strip markdown if model disobeys
-    if raw.startswith("```"):
-        raw = raw.removeprefix("```json")
-        raw = raw.removeprefix("```")
-        raw = raw.removesuffix("```")
-        raw = raw.strip()
+    size = count_tokens(code)
+    stats["submissions"] += 1
+    stats["codeTokensIn"] += size
 
-    try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError:
-        raise RuntimeError(f"Invalid AI JSON output:\n{raw}")
-
-    # Hard validation to avoid downstream crashes
-    required_keys = [
-        "strengths",
-        "weaknesses",
-        "improvements",
-        "recommendedNextSteps"
+    if size > FEEDBACK_CODE_BUDGET:
+        stats["compacted"] += 1
+        code = compact_code(code)
+        size = count_tokens(code)
+
+    if size <= FEEDBACK_CODE_BUDGET:
+        stats["parts"] += 1
+        stats["codeTokensSent"] += size
+        return [_prompt(task_description, code, execution=execution)]
+
+    chunks = split_chunks(code, FEEDBACK_CHUNK_TOKENS)
+    summary = outline(code, FEEDBACK_OUTLINE_TOKENS)
+    total = len(chunks)
+    chunks = chunks[:FEEDBACK_MAX_CHUNKS]
+
+    # Parts past the cap are not sent: the model must know, and say so
+    omitted = ""
+    if total > len(chunks):
+        stats["partsOmitted"] += total - len(chunks)
+        omitted = f"""Only parts 1-{len(chunks)} are reviewed; parts {len(chunks) + 1}-{total} were
+not sent. Do not judge code you have not seen, and state in
+weaknesses that the end of the submission was not reviewed because of
+its size.
+"""
+
+    stats["chunked"] += 1
+    stats["parts"] += len(chunks)
+    stats["codeTokensSent"] += sum(count_tokens(chunk) for chunk in chunks)
+
+    return [
+        _prompt(
+            task_description,
+            chunk,
+            f"""
+The submission is too large for one request. Below is PART {i} OF {total}.
+Evaluate only this part against the task; the outline lists the whole
+submission so you do not report code from other parts as missing.
+{omitted}
+SUBMISSION OUTLINE:
+{summary}
+""",
+            execution
+        )
+        for i, chunk in enumerate(chunks, 1)
     ]
 
-    for key in required_keys:
-        if key not in parsed:
-            raise RuntimeError(f"AI output missing required field: {key}")
-        if not isinstance(parsed[key], list) or not parsed[key]:
-            raise RuntimeError(f"AI output field '{key}' must be a non-empty list")
-        for item in parsed[key]:
-            if not isinstance(item, str) or not item.strip():
-                raise RuntimeError(f"Invalid entry in '{key}'")
+
+def merge_feedback(parts: list) -> dict:
+    """
+    Interleaves the parts' items per key (so no part crowds out the
+    rest), dropping repeats, up to FEEDBACK_MAX_ITEMS each.
+    """
+
+    merged = {}
+
+    for key in FEEDBACK_KEYS:
+        seen = set()
+        items = []
+        columns = [part[key] for part in parts]
+
+        for row in range(max(len(column) for column in columns)):
+            for column in columns:
+                if row >= len(column):
+                    continue
+                normalized = " ".join(column[row].lower().split())
+                if normalized not in seen:
+                    seen.add(normalized)
+                    items.append(column[row])
+
+        merged[key] = items[:FEEDBACK_MAX_ITEMS]
+
+    return merged
+
+
+async def _evaluate(prompt: str, bypass_cache: bool) -> dict:
+    raw = await feedback_agent.run(prompt, bypass_cache=bypass_cache)
+
+    try:
+        # A cut-off feedback list is still feedback
+        parsed = await parse_agent_json(feedback_agent, prompt, raw, allow_closed=True)
+        AI_FEEDBACK.validate(parsed)
+    except RuntimeError:
+        # Never serve an unusable completion from cache
+        await feedback_agent.forget(prompt)
+        raise
 
     return parsed
+
+
+async def generate_feedback(payload: dict, bypass_cache: bool = False) -> dict:
+    """
+    Expected payload:
+    {
+        "taskDescription": "string",
+        "submittedCode": "string",
+        "execution": {...}          # optional, app.sandbox.grade() result
+    }
+    """
+
+    prompts = build_feedback_prompts(payload)
+
+    if len(prompts) == 1:
+        return await _evaluate(prompts[0], bypass_cache)
+
+    parts = await asyncio.gather(*(_evaluate(prompt, bypass_cache) for prompt in prompts))
+    return merge_feedback(parts)
+
+
+def snapshot() -> dict:
+    return dict(stats)
+
+
+metrics.register("feedbackPrompts", snapshot)
@@ -1,14 +1,15 @@
 import json
 from app.ai.agent import Agent
+from app.ai.json_repair import parse_agent_json
+from app.schemas import AI_PLAN, SchemaError
 
-# Instantiate agent once (singleton-style)
-internship_agent = Agent(
-    name="internship_planner",
-    model="llama-3.3-70b-versatile",
-    system_prompt="""
+# Prompt building blocks, shared with the chunked planner (app/ai/planner.py)
+PLANNER_INTRO = """
 You are an execution-only internship planner that generates coding-first internship task plans from absolute scratch.
 
-CRITICAL RULES (NON-NEGOTIABLE):
+"""
+
+PLANNER_OUTPUT_RULES = """CRITICAL RULES (NON-NEGOTIABLE):
 - Output MUST be VALID JSON
 - Do NOT use markdown
 - Do NOT wrap output in ``` or ```json
@@ -17,7 +18,9 @@ CRITICAL RULES (NON-NEGOTIABLE):
 - Output ONLY a JSON object
 - If any rule cannot be satisfied, output an EMPTY JSON object: {}
 
-CORE EXECUTION PRINCIPLES:
+"""
+
+PLANNER_TASK_RULES = """CORE EXECUTION PRINCIPLES:
 - EVERY task MUST include writing or running code
 - NO theory-only or reading-only tasks
 - Learning tasks MUST include hands-on coding
@@ -87,7 +90,13 @@ REQUIRED TASK FIELDS (ALL MANDATORY):
 - estimatedHours
 - difficulty (easy | medium | hard)
 
-REQUIRED OUTPUT KEYS (TOP LEVEL ONLY):
+"""
+
+# Instantiate agent once (singleton-style)
+internship_agent = Agent(
+    name="internship_planner",
+    model="llama-3.3-70b-versatile",
+    system_prompt=PLANNER_INTRO + PLANNER_OUTPUT_RULES + PLANNER_TASK_RULES + """REQUIRED OUTPUT KEYS (TOP LEVEL ONLY):
 - internship
 - weekly_plans
 - tasks
@@ -103,8 +112,9 @@ You ONLY output the final JSON object.
 """
 )
 
-async def generate_plan(payload: dict) -> dict:
-    prompt = f"""
+
+def build_plan_prompt(payload: dict) -> str:
+    return f"""
 INPUT:
 {json.dumps(payload, indent=2)}
 
@@ -139,29 +149,61 @@ OUTPUT:
 }}
 """
 
-    raw = await internship_agent.run(prompt)
 
-    if not raw or not raw.strip():
-        raise RuntimeError("AI returned empty response")
+def validate_plan(plan: dict, payload: dict):
+    """
+    Schema check plus the rules the schema cannot express: weeks
+    1..durationWeeks exactly once each, tasks referring to those weeks,
+    and daysPerWeek tasks per week as requested in `payload`. Runs
+    before anything is written, so a bad or shortened plan leaves
+    nothing behind (and is never cached).
+    """
+
+    AI_PLAN.validate(plan)
+
+    weeks = int(payload["durationWeeks"])
+    days = int(payload["daysPerWeek"])
+
+    week_numbers = set()
+    for i, week in enumerate(plan["weekly_plans"]):
+        if week["weekNumber"] in week_numbers:
+            raise SchemaError("AI plan", f"weekly_plans[{i}].weekNumber", "is duplicated")
+        week_numbers.add(week["weekNumber"])
+
+    if week_numbers != set(range(1, weeks + 1)):
+        raise SchemaError(
+            "AI plan",
+            "weekly_plans",
+            f"must cover weeks 1..{weeks}, got {sorted(week_numbers)}"
+        )
+
+    per_week = dict.fromkeys(week_numbers, 0)
+    for i, task in enumerate(plan["tasks"]):
+        if task["weekNumber"] not in week_numbers:
+            raise SchemaError("AI plan", f"tasks[{i}].weekNumber", "references an unknown week")
+        per_week[task["weekNumber"]] += 1
+
+    if len(plan["tasks"]) != weeks * days:
+        raise SchemaError("AI plan", "tasks", f"must hold {weeks * days} tasks, got {len(plan['tasks'])}")
+
+    for number, count in sorted(per_week.items()):
+        if count != days:
+            raise SchemaError("AI plan", "tasks", f"week {number} has {count} tasks, expected {days}")
+
 
-    raw = raw.strip()
+async def generate_plan(payload: dict, bypass_cache: bool = False) -> dict:
+    prompt = build_plan_prompt(payload)
 
-    if raw.startswith("```"):
-        raw = raw.removeprefix("```json")
-        raw = raw.removeprefix("```")
-        raw = raw.removesuffix("```")
-        raw = raw.strip()
+    raw = await internship_agent.run(prompt, bypass_cache=bypass_cache)
 
     try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError:
-        raise RuntimeError(f"Invalid AI JSON output:\n{raw}")
-
-    # Hard validation to avoid downstream crashes
-    for task in parsed.get("tasks", []):
-        if "weekNumber" not in task:
-            raise RuntimeError("AI output missing required field: weekNumber")
-        if "description" not in task or not task["description"].strip():
-            raise RuntimeError("AI output has empty task description")
+        # Tolerates fences, prose and common defects; truncated output is
+        # continued rather than regenerated
+        parsed = await parse_agent_json(internship_agent, prompt, raw)
+        validate_plan(parsed, payload)
+    except RuntimeError:
+        # Never serve an unusable completion from cache
+        await internship_agent.forget(prompt)
+        raise
 
     return parsed
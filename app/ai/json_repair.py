@@ -0,0 +1,261 @@
+from dotenv import load_dotenv
+import json
+import os
+
+from app import metrics
+
+load_dotenv()
+
+# Continuation requests allowed for one truncated completion
+LLM_JSON_CONTINUATIONS = int(os.getenv("LLM_JSON_CONTINUATIONS", "2"))
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+# agent name -> outcome -> count
+stats = {}
+
+
+class TruncatedJSON(RuntimeError):
+    """
+    The output stops before its outermost object is closed.
+
+    `partial` is the object text so far (continuation prompt), `closed`
+    a best-effort completion cut back to the last complete element, or
+    None when nothing usable precedes the cut.
+    """
+
+    def __init__(self, partial, closed=None):
+        super().__init__("Invalid AI JSON output: truncated")
+        self.partial = partial
+        self.closed = closed
+
+
+def _last_significant(out):
+    for i in range(len(out) - 1, -1, -1):
+        if not out[i].isspace():
+            return i
+    return -1
+
+
+def _needs_comma(out) -> bool:
+    # A value just ended and another one starts: the model dropped a comma
+    i = _last_significant(out)
+    if i < 0:
+        return False
+    last = out[i]
+    return last in '"}]' or last.isdigit() or last in ("true", "false", "null")
+
+
+def _drop_trailing_comma(out):
+    i = _last_significant(out)
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def _repair(text: str, start: int):
+    """
+    Rewrites the object starting at `start`, fixing what models commonly
+    get wrong: trailing or missing commas, comments, Python literals,
+    raw newlines in strings, mismatched closers and trailing prose.
+
+    Returns (repaired_text, None) or, when the text ends first,
+    (None, closed_text_or_None).
+    """
+
+    out = []
+    stack = []
+    safe = None  # (len(out), stack) just after the last complete element
+    in_string = False
+    value = False  # the open string is a value, not an object key
+    escape = False
+    i, n = start, len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            if not in_string and value:
+                safe = (len(out), list(stack))
+            i += 1
+            continue
+
+        if ch == '"':
+            if _needs_comma(out):
+                out.append(",")
+            j = _last_significant(out)
+            value = stack[-1:] == ["]"] or (j >= 0 and out[j] == ":")
+            in_string = True
+            out.append(ch)
+
+        elif ch in "{[":
+            if _needs_comma(out):
+                out.append(",")
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                return "".join(out), None
+            safe = (len(out), list(stack))
+
+        elif ch == ",":
+            # Also ends numbers and literals, which could be cut mid-token
+            safe = (len(out), list(stack))
+            out.append(ch)
+
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+
+        elif ch.isalpha():
+            j = i
+            while j < n and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+
+        else:
+            out.append(ch)
+
+        i += 1
+
+    if safe is None:
+        return None, None
+
+    cut, open_stack = safe
+    return None, "".join(out[:cut]) + "".join(reversed(open_stack))
+
+
+def _strip_fences(raw: str) -> str:
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.removeprefix("```json").removeprefix("```")
+        raw = raw.removesuffix("```")
+    return raw.strip()
+
+
+def extract_json(raw: str):
+    """
+    Returns (object, "clean" | "repaired").
+
+    Raises TruncatedJSON when the object never closes, RuntimeError when
+    there is no recoverable object at all.
+    """
+
+    if not raw or not raw.strip():
+        raise RuntimeError("AI returned empty response")
+
+    raw = _strip_fences(raw)
+
+    try:
+        parsed = json.loads(raw)
+        if isinstance(parsed, dict):
+            return parsed, "clean"
+    except json.JSONDecodeError:
+        pass
+
+    start = raw.find("{")
+    if start < 0:
+        raise RuntimeError(f"Invalid AI JSON output:\n{raw}")
+
+    repaired, closed = _repair(raw, start)
+    if repaired is None:
+        raise TruncatedJSON(raw[start:], closed)
+
+    try:
+        return json.loads(repaired, strict=False), "repaired"
+    except json.JSONDecodeError:
+        raise RuntimeError(f"Invalid AI JSON output:\n{raw}")
+
+
+def _record(agent, outcome):
+    counts = stats.setdefault(agent.name, {})
+    counts[outcome] = counts.get(outcome, 0) + 1
+
+
+async def parse_agent_json(agent, prompt: str, raw: str, allow_closed: bool = False) -> dict:
+    """
+    extract_json() plus recovery for truncated output: the model is asked
+    to continue from where it stopped (up to LLM_JSON_CONTINUATIONS
+    times) rather than to regenerate. With `allow_closed`, as a last
+    resort the object is closed after its last complete element; only
+    for outputs where a shortened list is still a valid answer (never
+    plans: dropped weeks or tasks would pass for a complete plan).
+
+    Recovered objects replace the raw completion in the response cache,
+    so a cache hit never pays for the repair again.
+    """
+
+    text = raw
+    outcome = None
+
+    for attempt in range(LLM_JSON_CONTINUATIONS + 1):
+        try:
+            parsed, outcome = extract_json(text)
+            break
+        except TruncatedJSON as e:
+            truncated = e
+        except RuntimeError:
+            _record(agent, "failed")
+            raise
+
+        if attempt == LLM_JSON_CONTINUATIONS:
+            if not allow_closed or truncated.closed is None:
+                _record(agent, "failed")
+                raise truncated
+            try:
+                parsed, outcome = json.loads(truncated.closed, strict=False), "closed"
+            except json.JSONDecodeError:
+                _record(agent, "failed")
+                raise truncated
+            break
+
+        tail = await agent.continue_from(prompt, truncated.partial)
+        # Leading whitespace may be part of a string cut mid-word
+        if tail.lstrip().startswith("```"):
+            tail = _strip_fences(tail)
+        text = truncated.partial + tail
+
+        # Some models restart from scratch instead of continuing
+        if tail.lstrip().startswith("{"):
+            try:
+                extract_json(text)
+            except RuntimeError:
+                text = tail
+
+    if attempt and outcome != "closed":
+        outcome = "continued"
+
+    _record(agent, outcome)
+
+    if outcome != "clean":
+        await agent.remember(prompt, json.dumps(parsed, ensure_ascii=False))
+
+    return parsed
+
+
+def snapshot() -> dict:
+    return {name: dict(counts) for name, counts in stats.items()}
+
+
+metrics.register("llmJson", snapshot)
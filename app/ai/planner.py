@@ -0,0 +1,224 @@
+from dotenv import load_dotenv
+import asyncio
+import json
+import os
+
+from app.ai.agent import Agent
+from app.ai.generate import (
+    PLANNER_INTRO,
+    PLANNER_OUTPUT_RULES,
+    PLANNER_TASK_RULES
+)
+from app.ai.json_repair import parse_agent_json
+from app.schemas import AI_SKELETON, AI_WEEK_TASKS
+
+load_dotenv()
+
+# Plans at least this long are generated week by week
+PLAN_CHUNK_MIN_WEEKS = int(os.getenv("PLAN_CHUNK_MIN_WEEKS", "3"))
+# Max per-week task generations in flight for one plan
+PLAN_CHUNK_CONCURRENCY = int(os.getenv("PLAN_CHUNK_CONCURRENCY", "4"))
+# Extra attempts for a chunk that fails validation
+PLAN_CHUNK_RETRIES = int(os.getenv("PLAN_CHUNK_RETRIES", "2"))
+
+
+skeleton_agent = Agent(
+    name="internship_skeleton_planner",
+    model="llama-3.3-70b-versatile",
+    system_prompt=PLANNER_INTRO + PLANNER_OUTPUT_RULES + """SKELETON RULES:
+- Plan the internship outline ONLY; tasks are generated separately per week
+- Produce EXACTLY durationWeeks weekly plans, numbered 1..durationWeeks
+- learningObjectives MUST name the concrete libraries, tools and code
+  that week's tasks will build
+- Difficulty must strictly increase from week to week
+
+REQUIRED OUTPUT KEYS (TOP LEVEL ONLY):
+- internship
+- weekly_plans
+
+OUTPUT CONSTRAINTS:
+- No extra keys
+- No missing fields
+- No null values
+
+You ONLY output the final JSON object.
+"""
+)
+
+week_tasks_agent = Agent(
+    name="internship_week_planner",
+    model="llama-3.3-70b-versatile",
+    system_prompt=PLANNER_INTRO + PLANNER_OUTPUT_RULES + PLANNER_TASK_RULES + """WEEK MODE:
+- You generate the tasks of ONE week of an existing internship outline
+- Produce EXACTLY daysPerWeek tasks, all with the given weekNumber
+- The first task MUST have the given firstContentType, then alternate
+- Tasks MUST implement that week's learningObjectives
+
+REQUIRED OUTPUT KEYS (TOP LEVEL ONLY):
+- tasks
+
+OUTPUT CONSTRAINTS:
+- No extra keys
+- No missing fields
+- No null values
+- No duplicated task titles
+- Descriptions must not assume provided inputs
+
+You ONLY output the final JSON object.
+"""
+)
+
+
+def use_chunked_planner(payload: dict) -> bool:
+    try:
+        return int(payload.get("durationWeeks", 0)) >= PLAN_CHUNK_MIN_WEEKS
+    except (TypeError, ValueError):
+        return False
+
+
+def _validate_skeleton(skeleton: dict, weeks: int):
+    AI_SKELETON.validate(skeleton)
+
+    numbers = sorted(w["weekNumber"] for w in skeleton["weekly_plans"])
+    if numbers != list(range(1, weeks + 1)):
+        raise RuntimeError(f"AI skeleton must cover weeks 1..{weeks}, got {numbers}")
+
+
+def _validate_week(output: dict, week_number: int, days: int, first_type: str):
+    AI_WEEK_TASKS.validate(output)
+
+    tasks = output["tasks"]
+    if len(tasks) != days:
+        raise RuntimeError(f"Week {week_number}: expected {days} tasks")
+
+    expected = first_type
+    for task in tasks:
+        if task["weekNumber"] != week_number:
+            raise RuntimeError(f"Week {week_number}: task has weekNumber {task['weekNumber']}")
+        if task["contentType"] != expected:
+            raise RuntimeError(f"Week {week_number}: tasks must alternate learning/coding")
+        expected = "coding" if expected == "learning" else "learning"
+
+
+async def _generate_skeleton(payload: dict, weeks: int, bypass_cache: bool) -> dict:
+    prompt = f"""
+INPUT:
+{json.dumps(payload, indent=2)}
+
+OUTPUT:
+{{
+  "internship": {{
+    "domain": "",
+    "title": "",
+    "durationWeeks": 0,
+    "daysPerWeek": 0,
+    "status": "planned"
+  }},
+  "weekly_plans": [
+    {{
+      "weekNumber": 1,
+      "learningObjectives": ""
+    }}
+  ]
+}}
+"""
+
+    for attempt in range(PLAN_CHUNK_RETRIES + 1):
+        raw = await skeleton_agent.run(prompt, bypass_cache=bypass_cache or attempt > 0)
+        try:
+            skeleton = await parse_agent_json(skeleton_agent, prompt, raw)
+            _validate_skeleton(skeleton, weeks)
+            return skeleton
+        except RuntimeError:
+            await skeleton_agent.forget(prompt)
+            if attempt == PLAN_CHUNK_RETRIES:
+                raise
+
+
+async def _generate_week(payload, skeleton, week, days, bypass_cache) -> list:
+    week_number = week["weekNumber"]
+
+    # Global alternation: day 0 of the internship is a learning task
+    first_day = (week_number - 1) * days
+    first_type = "learning" if first_day % 2 == 0 else "coding"
+
+    prompt = f"""
+INPUT:
+{json.dumps({
+    "request": payload,
+    "internship": skeleton["internship"],
+    "outline": skeleton["weekly_plans"],
+    "weekNumber": week_number,
+    "learningObjectives": week["learningObjectives"],
+    "daysPerWeek": days,
+    "firstContentType": first_type
+}, indent=2)}
+
+OUTPUT:
+{{
+  "tasks": [
+    {{
+      "internshipId": "",
+      "weekId": "",
+      "weekNumber": {week_number},
+      "title": "",
+      "contentType": "{first_type}",
+      "description": "",
+      "expectedDeliverables": "",
+      "estimatedHours": 0,
+      "difficulty": ""
+    }}
+  ]
+}}
+"""
+
+    for attempt in range(PLAN_CHUNK_RETRIES + 1):
+        # Retries skip the cache: only this week is regenerated
+        raw = await week_tasks_agent.run(prompt, bypass_cache=bypass_cache or attempt > 0)
+        try:
+            output = await parse_agent_json(week_tasks_agent, prompt, raw)
+            _validate_week(output, week_number, days, first_type)
+            return output["tasks"]
+        except RuntimeError as e:
+            await week_tasks_agent.forget(prompt)
+            if attempt == PLAN_CHUNK_RETRIES:
+                raise RuntimeError(f"Week {week_number} generation failed: {e}") from e
+
+
+async def generate_plan_chunked(payload: dict, bypass_cache: bool = False) -> dict:
+    """
+    Skeleton first (internship + weekly_plans), then each week's tasks
+    concurrently (PLAN_CHUNK_CONCURRENCY at a time). Every chunk is
+    validated on its own and only failing chunks are retried; a week
+    that still fails cancels the weeks in flight.
+
+    Returns the same shape as generate_plan.
+    """
+
+    weeks = int(payload["durationWeeks"])
+    days = int(payload["daysPerWeek"])
+
+    skeleton = await _generate_skeleton(payload, weeks, bypass_cache)
+    week_plans = sorted(skeleton["weekly_plans"], key=lambda w: w["weekNumber"])
+
+    semaphore = asyncio.Semaphore(PLAN_CHUNK_CONCURRENCY)
+
+    async def bounded(week):
+        async with semaphore:
+            return await _generate_week(payload, skeleton, week, days, bypass_cache)
+
+    tasks = [asyncio.ensure_future(bounded(w)) for w in week_plans]
+    try:
+        chunks = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed week fails the plan: stop paying for the others
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return {
+        "internship": skeleton["internship"],
+        "weekly_plans": week_plans,
+        "tasks": [task for chunk in chunks for task in chunk]
+    }
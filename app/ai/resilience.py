@@ -0,0 +1,279 @@
+from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import asyncio
+import os
+import random
+import time
+import weakref
+import httpx
+
+from app import metrics
+
+load_dotenv()
+
+# Extra attempts after a 429 / 5xx / transport error
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+# Longest single wait; a larger Retry-After fails the call instead
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+# Total time one call may spend across all its attempts and waits
+LLM_RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET", "90"))
+
+# Consecutive provider failures that open the breaker, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# In-flight requests per model; LLM_MODEL_LIMITS="model-a=4,model-b=2" overrides
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "8"))
+LLM_MODEL_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        item.partition("=") for item in os.getenv("LLM_MODEL_LIMITS", "").split(",")
+        if "=" in item
+    )
+}
+
+
+class LLMError(RuntimeError):
+    """
+    Base of all LLM call failures. Subclasses RuntimeError so existing
+    `except RuntimeError` handlers keep working.
+    """
+
+    retryable = False
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMRequestError(LLMError):
+    """4xx other than 429: the request itself is wrong, retrying won't help."""
+
+
+class LLMRateLimited(LLMError):
+    """429 from the provider."""
+
+    retryable = True
+
+    def __init__(self, message, status=429, retry_after=None):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(LLMError):
+    """5xx or transport failure (connect error, timeout)."""
+
+    retryable = True
+
+
+class CircuitOpen(LLMError):
+    """The provider failed repeatedly; calls fail fast until it recovers."""
+
+
+def parse_retry_after(value):
+    """
+    Retry-After as seconds: either delta-seconds or an HTTP date.
+    """
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def error_for(status, body, headers=None) -> LLMError:
+    message = f"LLM request failed (status={status}): {body}"
+
+    if status == 429:
+        retry_after = parse_retry_after((headers or {}).get("retry-after"))
+        return LLMRateLimited(message, status, retry_after)
+    if status >= 500:
+        return LLMUnavailable(message, status)
+    return LLMRequestError(message, status)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half-open
+    after `reset_timeout`, letting a single probe through; the probe's
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == "closed":
+            return
+
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return
+
+        raise CircuitOpen("LLM provider unavailable (circuit open)")
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def release(self):
+        # The probe ended without a verdict (cancelled): let another call probe
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+_breakers = {}  # provider url -> CircuitBreaker
+# asyncio primitives are bound to one loop: semaphores are kept per loop
+_semaphores = weakref.WeakKeyDictionary()
+
+stats = {
+    "retries": 0,
+    "rateLimited": 0,
+    "unavailable": 0,
+    "circuitRejections": 0,
+    "budgetExhausted": 0
+}
+
+
+def breaker_for(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+    return breaker
+
+
+@asynccontextmanager
+async def model_slot(model: str):
+    """
+    Bounds in-flight requests per model, including their retry waits.
+    """
+
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = per_loop.get(model)
+    if semaphore is None:
+        semaphore = per_loop[model] = asyncio.Semaphore(
+            LLM_MODEL_LIMITS.get(model, LLM_MODEL_CONCURRENCY)
+        )
+
+    async with semaphore:
+        yield
+
+
+def backoff_delay(attempt: int, error: LLMError) -> float:
+    """
+    Full-jitter exponential backoff, unless the provider said how long
+    to wait.
+    """
+
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+
+    cap = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+async def call_with_retry(provider: str, send):
+    """
+    Awaits `send()` (one request attempt), retrying retryable LLMErrors
+    and httpx transport errors with backoff behind the provider's
+    circuit breaker.
+
+    The whole call, attempts and waits included, is bounded by
+    LLM_RETRY_BUDGET: a slow provider cannot hold a model slot for
+    retries x read timeout.
+    """
+
+    breaker = breaker_for(provider)
+    deadline = time.monotonic() + LLM_RETRY_BUDGET
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            breaker.before_call()
+        except CircuitOpen:
+            stats["circuitRejections"] += 1
+            raise
+
+        try:
+            async with asyncio.timeout(deadline - time.monotonic()):
+                result = await send()
+        except TimeoutError:
+            stats["budgetExhausted"] += 1
+            breaker.record_failure()
+            raise LLMUnavailable(f"LLM call exceeded its {LLM_RETRY_BUDGET:g}s budget")
+        except httpx.TransportError as e:
+            error = LLMUnavailable(f"LLM request failed ({type(e).__name__}): {e}")
+            error.__cause__ = e
+        except LLMError as e:
+            error = e
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if isinstance(error, LLMUnavailable):
+            # Only provider-side failures count towards opening the circuit
+            stats["unavailable"] += 1
+            breaker.record_failure()
+        else:
+            # 429 / 4xx: the provider is up and answering
+            breaker.record_success()
+            if isinstance(error, LLMRateLimited):
+                stats["rateLimited"] += 1
+
+        if not error.retryable or attempt == LLM_MAX_RETRIES:
+            raise error
+
+        delay = backoff_delay(attempt, error)
+        if delay > LLM_RETRY_MAX_DELAY or delay >= deadline - time.monotonic():
+            raise error
+
+        stats["retries"] += 1
+        await asyncio.sleep(delay)
+
+
+def snapshot() -> dict:
+    return {
+        **stats,
+        "breakers": {
+            provider: {"state": b.state, "failures": b.failures}
+            for provider, b in _breakers.items()
+        }
+    }
+
+
+metrics.register("llmResilience", snapshot)
@@ -0,0 +1,90 @@
+import json
+
+
+class PlanStreamParser:
+    """
+    Incremental parser for a streamed plan object:
+
+        {"internship": {...}, "weekly_plans": [{...}, ...], "tasks": [{...}, ...]}
+
+    feed() accepts arbitrary text fragments and returns the elements that
+    became complete, as ("internship" | "week" | "task", dict) events.
+    Anything before the first "{" (e.g. a stray ``` fence) is ignored.
+    """
+
+    ARRAY_EVENTS = {"weekly_plans": "week", "tasks": "task"}
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0            # absolute index of the next char to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None    # most recent top-level key
+        self._value_key = None   # top-level key whose value is open
+        self._element_start = None
+        self.done = False
+
+    def feed(self, text: str) -> list:
+        events = []
+        if self.done:
+            return events
+
+        self._text += text
+
+        for ch in text:
+            pos = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = json.loads(self._text[self._string_start:pos + 1])
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+
+            elif ch in "{[":
+                self._depth += 1
+
+                if self._depth == 2:
+                    self._value_key = self._last_key
+                    if ch == "{":
+                        self._element_start = pos
+                elif self._depth == 3 and self._value_key in self.ARRAY_EVENTS:
+                    self._element_start = pos
+
+            elif ch in "}]":
+                self._depth -= 1
+
+                if self._depth == 0:
+                    self.done = True
+                    break
+
+                if self._depth == 1 and self._value_key == "internship" and ch == "}":
+                    events.append(("internship", self._load(pos)))
+                elif self._depth == 2 and self._value_key in self.ARRAY_EVENTS and ch == "}":
+                    events.append((self.ARRAY_EVENTS[self._value_key], self._load(pos)))
+
+        return events
+
+    def _load(self, end) -> dict:
+        raw = self._text[self._element_start:end + 1]
+        self._element_start = None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            raise RuntimeError(f"Invalid AI JSON output:\n{raw}")
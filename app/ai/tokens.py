@@ -0,0 +1,142 @@
+from dotenv import load_dotenv
+from contextlib import contextmanager
+import contextvars
+import math
+import os
+import threading
+
+from app import metrics
+
+load_dotenv()
+
+# Exact BPE counts (tiktoken is in requirements). The encoding file is
+# downloaded on first load unless TIKTOKEN_CACHE_DIR already holds it;
+# while it loads, or if it cannot, counts use the heuristic below.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "cl100k_base")
+# Heuristic fallback; code averages fewer characters per token than prose
+CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3.5"))
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = tiktoken is None
+_warming_pid = None  # process whose thread is loading the encoding
+
+# agent name -> counters
+stats = {}
+
+# Usage of every LLM call made under tracking(), including gathered subtasks
+_tracked = contextvars.ContextVar("llm_usage", default=None)
+
+
+def _load_encoding():
+    global _encoding, _encoding_failed
+
+    try:
+        _encoding = tiktoken.get_encoding(LLM_TOKENIZER)
+    except Exception as e:
+        print(f"Tokenizer {LLM_TOKENIZER} unavailable, estimating tokens: {e}")
+        _encoding_failed = True
+
+
+def warm():
+    """
+    Loads the encoding in a background thread (called at app start), so
+    the download never happens on a request or on the runtime loop.
+    Safe to call repeatedly and after fork.
+    """
+
+    global _warming_pid
+
+    if _encoding is not None or _encoding_failed:
+        return
+
+    with _encoding_lock:
+        if _warming_pid == os.getpid():
+            return
+        _warming_pid = os.getpid()
+
+    threading.Thread(target=_load_encoding, name="tokenizer-warmup", daemon=True).start()
+
+
+def _get_encoding():
+    # Never waits: until the encoding is ready, callers estimate
+    if _encoding is None:
+        warm()
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def record(agent_name: str, prompt_tokens: int, completion_tokens: int):
+    counts = stats.setdefault(agent_name, {
+        "requests": 0,
+        "promptTokens": 0,
+        "completionTokens": 0,
+        "maxPromptTokens": 0
+    })
+    counts["requests"] += 1
+    counts["promptTokens"] += prompt_tokens
+    counts["completionTokens"] += completion_tokens
+    counts["maxPromptTokens"] = max(counts["maxPromptTokens"], prompt_tokens)
+
+    usage = _tracked.get()
+    if usage is not None:
+        usage["requests"] += 1
+        usage["promptTokens"] += prompt_tokens
+        usage["completionTokens"] += completion_tokens
+
+
+@contextmanager
+def tracking():
+    """
+    Collects the token usage of the LLM calls made inside the block:
+
+        with tracking() as usage:
+            await generate_feedback(...)
+    """
+
+    usage = {"requests": 0, "promptTokens": 0, "completionTokens": 0}
+    token = _tracked.set(usage)
+    try:
+        yield usage
+    finally:
+        _tracked.reset(token)
+
+
+def charge(usage: dict):
+    """
+    Adds usage measured elsewhere (e.g. a share of a batched request) to
+    the caller's tracking() block, if any. Totals in `stats` are not
+    touched: record() already counted the request.
+    """
+
+    tracked = _tracked.get()
+    if tracked is not None:
+        for key, value in usage.items():
+            tracked[key] += value
+
+
+def snapshot() -> dict:
+    return {
+        "tokenizer": LLM_TOKENIZER if _encoding is not None else (
+            "heuristic" if _encoding_failed else "loading"
+        ),
+        "agents": {name: dict(counts) for name, counts in stats.items()}
+    }
+
+
+metrics.register("llmTokens", snapshot)
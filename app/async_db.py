@@ -0,0 +1,60 @@
+import asyncio
+import weakref
+from pymongo import AsyncMongoClient
+
+from app.db import MONGO_URI, DB_NAME, client_options
+from app.runtime import runtime
+
+# Async counterpart of app/db.py for code running on an event loop.
+# Handles are resolved per running loop through attribute access:
+#
+#     from app import async_db
+#     await async_db.tasks_col.insert_many(docs)
+COLLECTIONS = {
+    "users_col": "users",
+    "user_skills_col": "user_skills",
+    "internships_col": "internships",
+    "weekly_plans_col": "weekly_plans",
+    "tasks_col": "tasks",
+    "submissions_col": "submissions",
+    "feedback_col": "feedback",
+    "llm_cache_col": "llm_cache",
+    "jobs_col": "jobs",
+    "cache_generations_col": "cache_generations",
+    "revoked_tokens_col": "revoked_tokens",
+}
+
+# Async clients are bound to the loop they were first used on
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> AsyncMongoClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        client = AsyncMongoClient(MONGO_URI, **client_options())
+        _clients[loop] = client
+
+    return client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def __getattr__(name):
+    if name in COLLECTIONS:
+        return get_db()[COLLECTIONS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def close_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+
+    if client is not None:
+        await client.close()
+
+
+runtime.on_shutdown(close_client)
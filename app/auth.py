@@ -1,24 +1,273 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token
-from datetime import datetime
-from app.db import users_col
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import (
+    create_access_token,
+    create_refresh_token,
+    get_jwt,
+    get_jwt_identity,
+    jwt_required
+)
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError, PyMongoError
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from app import async_db, metrics
+from app.db import revoked_tokens_col, users_col
+from app.passwords import PasswordServiceBusy, password_hasher
+from app.runtime import runtime
+from app.schemas import CREDENTIALS_REQUEST
+
+load_dotenv()
+
+JWT_ACCESS_MINUTES = int(os.getenv("JWT_ACCESS_MINUTES", "15"))
+JWT_REFRESH_DAYS = int(os.getenv("JWT_REFRESH_DAYS", "30"))
+# How stale a worker's view of revocations made by other workers may get
+TOKEN_REVOCATION_SYNC = float(os.getenv("TOKEN_REVOCATION_SYNC", "5"))
+# Overlap between incremental syncs, covering clock skew between hosts
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=30)
+
+# User fields copied into access tokens (readable by anyone holding one)
+PROFILE_CLAIMS = (
+    "email",
+    "name",
+    "college",
+    "course",
+    "semester",
+    "authProvider",
+    "emailVerified",
+    "onboardingCompleted"
+)
 
 auth_bp = Blueprint("auth", __name__)
 
+
+class RevocationList:
+    """
+    Revoked token ids (jti) and token families, mirrored from the
+    revoked_tokens collection into a dict of 16-byte UUID keys -> expiry.
+
+    Checked on every authenticated request without any I/O: a refresher
+    on the runtime loop pulls new revocations every TOKEN_REVOCATION_SYNC
+    seconds, and drops entries once the tokens they block have expired
+    anyway. Revocations made in this process apply at once.
+    """
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._entries = {}
+        self._cursor = None             # newest revokedAt seen
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"revocations": 0, "syncs": 0, "syncErrors": 0, "reuseDetected": 0}
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            runtime.spawn(self._refresher())
+
+    @staticmethod
+    def _key(value: str) -> bytes:
+        return uuid.UUID(value).bytes
+
+    def _add(self, value, expires_at: datetime):
+        key = self._key(value)
+        with self._lock:
+            self._entries[key] = expires_at.timestamp()
+
+    @staticmethod
+    def _document(value, kind, user_id, expires_at) -> dict:
+        return {
+            "_id": value,
+            "kind": kind,
+            "userId": ObjectId(user_id),
+            "revokedAt": datetime.now(timezone.utc),
+            "expiresAt": expires_at
+        }
+
+    def _record(self, value, kind, user_id, expires_at):
+        # Raises DuplicateKeyError when `value` was already revoked
+        revoked_tokens_col.insert_one(self._document(value, kind, user_id, expires_at))
+        self._add(value, expires_at)
+        self.stats["revocations"] += 1
+
+    def revoke(self, value, kind, user_id, expires_at: datetime):
+        try:
+            self._record(value, kind, user_id, expires_at)
+        except DuplicateKeyError:
+            self._add(value, expires_at)
+
+    async def _arevoke(self, value, kind, user_id, expires_at: datetime):
+        try:
+            await async_db.revoked_tokens_col.insert_one(self._document(value, kind, user_id, expires_at))
+            self.stats["revocations"] += 1
+        except DuplicateKeyError:
+            pass
+        except PyMongoError as e:
+            # Still blocked here; other workers miss it until it is retried
+            self.stats["syncErrors"] += 1
+            print(f"Token revocation of {kind} {value} not stored: {e}")
+
+    def consume(self, jti, user_id, expires_at: datetime) -> bool:
+        """
+        Revokes a refresh token as it is exchanged. False when it had
+        already been used: atomic across workers, unlike the mirror.
+        """
+
+        try:
+            self._record(jti, "jti", user_id, expires_at)
+        except DuplicateKeyError:
+            self._add(jti, expires_at)
+            return False
+        return True
+
+    def reuse_detected(self, payload: dict):
+        # A rotated refresh token came back: it leaked, end the whole login.
+        # Blocked here at once; the write runs in the background
+        self.stats["reuseDetected"] += 1
+        expires_at = _family_expiry()
+        self._add(payload["fam"], expires_at)
+        runtime.spawn(self._arevoke(payload["fam"], "family", payload["sub"], expires_at))
+
+    def is_revoked(self, payload: dict) -> bool:
+        self.ensure_started()
+
+        family = payload.get("fam")
+        if family is not None and self._key(family) in self._entries:
+            return True
+        if self._key(payload["jti"]) not in self._entries:
+            return False
+
+        if payload["type"] == "refresh" and family is not None:
+            self.reuse_detected(payload)
+        return True
+
+    async def _refresher(self):
+        while True:
+            await self._sync()
+            await asyncio.sleep(self.sync_interval)
+
+    async def _sync(self):
+        try:
+            query = {}
+            if self._cursor is not None:
+                query["revokedAt"] = {"$gte": self._cursor - REVOCATION_SYNC_OVERLAP}
+
+            async for doc in async_db.revoked_tokens_col.find(query, {"revokedAt": 1, "expiresAt": 1}):
+                revoked_at = doc["revokedAt"].replace(tzinfo=timezone.utc)
+                self._add(doc["_id"], doc["expiresAt"].replace(tzinfo=timezone.utc))
+                if self._cursor is None or revoked_at > self._cursor:
+                    self._cursor = revoked_at
+
+            now = time.time()
+            # Pruned in place, under the lock _add takes: a rebuilt dict
+            # would drop entries request threads add meanwhile
+            with self._lock:
+                for key in [k for k, exp in self._entries.items() if exp <= now]:
+                    del self._entries[key]
+            self.stats["syncs"] += 1
+        except PyMongoError as e:
+            # Retried next interval
+            self.stats["syncErrors"] += 1
+            print(f"Token revocation sync failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+
+revocations = RevocationList(TOKEN_REVOCATION_SYNC)
+metrics.register("tokenRevocations", revocations.snapshot)
+
+
+def init_tokens(app, jwt):
+    """
+    Token lifetimes and the revocation check for the app's JWTManager.
+    """
+
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=JWT_ACCESS_MINUTES)
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=JWT_REFRESH_DAYS)
+
+    @jwt.token_in_blocklist_loader
+    def _is_revoked(jwt_header, jwt_payload):
+        return revocations.is_revoked(jwt_payload)
+
+
+def profile_claims(user: dict) -> dict:
+    """
+    The PROFILE_CLAIMS fields of the user document, rendered as GET
+    /users/me would, for embedding in access tokens. Anything else is
+    read with ?fresh=1.
+    """
+
+    profile = {k: user[k] for k in PROFILE_CLAIMS if k in user}
+    return json.loads(current_app.json.dumps(profile))
+
+
+def access_token_for(user: dict, family: str) -> str:
+    return create_access_token(
+        identity=str(user["_id"]),
+        additional_claims={"fam": family, "profile": profile_claims(user)}
+    )
+
+
+def issue_tokens(user: dict, family: str = None) -> dict:
+    """
+    A short-lived access token carrying the profile, and a refresh token.
+    Both belong to a family (one per login) that logout revokes at once.
+    """
+
+    family = family or str(uuid.uuid4())
+
+    return {
+        "accessToken": access_token_for(user, family),
+        "refreshToken": create_refresh_token(
+            identity=str(user["_id"]),
+            additional_claims={"fam": family}
+        )
+    }
+
+
+def _expiry(claims) -> datetime:
+    return datetime.fromtimestamp(claims["exp"], timezone.utc)
+
+
+def _family_expiry() -> datetime:
+    # Rotation keeps a family alive as long as its newest refresh token
+    return datetime.now(timezone.utc) + timedelta(days=JWT_REFRESH_DAYS)
+
+
+def _busy():
+    response = jsonify({"error": "Too many sign-ins right now, try again shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @auth_bp.route("/register", methods=["POST"])
-def register():
+async def register():
     data = request.json
 
-    if not data or "email" not in data or "password" not in data:
-        return jsonify({"error": "email and password required"}), 400
+    error = CREDENTIALS_REQUEST.error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    if users_col.find_one({"email": data["email"]}):
-        return jsonify({"error": "User already exists"}), 409
+    try:
+        password_hash = await password_hasher.hash(data["password"])
+    except PasswordServiceBusy:
+        return _busy()
 
     user = {
         "email": data["email"],
-        "passwordHash": generate_password_hash(data["password"]),
+        "passwordHash": password_hash,
         "authProvider": "local",
         "name": data.get("name"),
         "college": data.get("college"),
@@ -30,23 +279,69 @@ def register():
         "updatedAt": datetime.utcnow()
     }
 
-    users_col.insert_one(user)
+    # One round trip; the unique email index (email_unique) rejects duplicates
+    try:
+        await async_db.users_col.insert_one(user)
+    except DuplicateKeyError:
+        return jsonify({"error": "User already exists"}), 409
 
     return jsonify({"message": "User registered"}), 201
 
 @auth_bp.route("/login", methods=["POST"])
-def login():
+async def login():
     data = request.json
 
-    if not data or "email" not in data or "password" not in data:
-        return jsonify({"error": "email and password required"}), 400
+    error = CREDENTIALS_REQUEST.error(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    user = await async_db.users_col.find_one({"email": data["email"]})
+
+    try:
+        if not user or not await password_hasher.verify(user["passwordHash"], data["password"]):
+            return jsonify({"error": "Invalid credentials"}), 401
+
+        if await password_hasher.needs_rehash(user["passwordHash"]):
+            # Hashing parameters changed: upgrade in the background,
+            # the response does not wait for it
+            runtime.spawn(password_hasher.upgrade(
+                async_db.users_col, user["_id"], user["passwordHash"], data["password"]
+            ))
+    except PasswordServiceBusy:
+        return _busy()
+
+    return jsonify(issue_tokens(user)), 200
+
+
+@auth_bp.route("/refresh", methods=["POST"])
+@jwt_required(refresh=True)
+def refresh():
+    """
+    Exchanges a refresh token for a new pair (rotation). A refresh token
+    presented twice means it leaked: its whole family is revoked.
+    """
+
+    claims = get_jwt()
+    user_id = get_jwt_identity()
+
+    # Used concurrently in another worker, before this one synced
+    if not revocations.consume(claims["jti"], user_id, _expiry(claims)):
+        revocations.reuse_detected(claims)
+        return jsonify({"error": "Refresh token already used"}), 401
 
-    user = users_col.find_one({"email": data["email"]})
+    # Also refreshes the profile claims
+    user = users_col.find_one({"_id": ObjectId(user_id)}, {"passwordHash": 0})
+    if not user:
+        return jsonify({"error": "User not found"}), 401
 
-    if not user or not check_password_hash(user["passwordHash"], data["password"]):
-        return jsonify({"error": "Invalid credentials"}), 401
+    return jsonify(issue_tokens(user, claims["fam"])), 200
 
-    token = create_access_token(identity=str(user["_id"]))
 
-    return jsonify({"accessToken": token}), 200
+@auth_bp.route("/logout", methods=["POST"])
+@jwt_required(refresh=True)
+def logout():
+    # Revokes the refresh token and every access token of this login
+    claims = get_jwt()
+    revocations.revoke(claims["fam"], "family", get_jwt_identity(), _family_expiry())
 
+    return jsonify({"message": "Logged out"}), 200
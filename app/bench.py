@@ -0,0 +1,455 @@
+from contextlib import contextmanager
+import asyncio
+import os
+import time
+import uuid
+import click
+import httpx
+from flask.cli import AppGroup
+
+from app.runtime import runtime
+
+bench_cli = AppGroup("bench", help="Reproducible benchmarks for the server's hot paths.")
+
+
+def _report(label, elapsed, latencies, unit="calls"):
+    latencies = sorted(latencies)
+    click.echo(f"{label}")
+    click.echo(f"  {unit}/s  {len(latencies) / elapsed:.1f}")
+    click.echo(f"  p50      {latencies[len(latencies) // 2] * 1000:.1f} ms")
+    click.echo(f"  p95      {latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000:.1f} ms")
+
+
+async def _measure(calls, concurrency, call):
+    """
+    Awaits `call(i)` for i in range(calls), at most `concurrency` at once.
+    Returns (elapsed seconds, per-call latencies).
+    """
+
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def _one(i):
+        async with gate:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(calls)))
+    return time.perf_counter() - started, latencies
+
+
+@contextmanager
+def _provider(fake, latency):
+    """
+    Points the agents at a local fake provider when `fake` is set,
+    otherwise at the configured LLM_BASE_URL.
+    """
+
+    if not fake:
+        yield None
+        return
+
+    from app.ai.fake_llm import FakeLLM
+
+    saved = {name: os.environ.get(name) for name in ("LLM_BASE_URL", "LLM_API_KEY")}
+    with FakeLLM(reply='{"ok": true}', latency=latency) as server:
+        os.environ["LLM_BASE_URL"] = server.url
+        os.environ["LLM_API_KEY"] = saved["LLM_API_KEY"] or "bench"
+        try:
+            yield server
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+@bench_cli.command("llm")
+@click.option("--calls", default=200, show_default=True, help="Completions to request.")
+@click.option("--concurrency", default=8, show_default=True, help="Calls in flight at once.")
+@click.option("--fake/--real", default=True, show_default=True, help="Local fake provider or LLM_BASE_URL.")
+@click.option("--latency", default=0.02, show_default=True, help="Fake provider latency in seconds.")
+def bench_llm_command(calls, concurrency, fake, latency):
+    """Compare the pooled LLM client with a fresh client per call."""
+
+    from app.ai.agent import Agent
+    from app.ai.client import LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+
+    agent = Agent(name="bench", model=os.getenv("LLM_BENCH_MODEL", "llama-3.1-8b-instant"),
+                  system_prompt="Reply with OK.")
+
+    def _prompt(i):
+        # Unique prompts: the response cache must not answer
+        return f"ping {uuid.uuid4().hex} {i}"
+
+    async def _fresh(i):
+        # The pre-pooling path: a new client (and connection) per call
+        payload, headers = agent._request(_prompt(i))
+        timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(agent.base_url, json=payload, headers=headers)
+        response.raise_for_status()
+
+    async def _pooled(i):
+        await agent._complete(_prompt(i))
+
+    with _provider(fake, latency) as server:
+        for label, call in (("fresh client per call", _fresh), ("pooled client", _pooled)):
+            seen = len(server.connections) if server else 0
+            elapsed, latencies = runtime.run(_measure(calls, concurrency, call))
+            _report(label, elapsed, latencies)
+            if server:
+                click.echo(f"  connections opened  {len(server.connections) - seen}")
+
+
+def _ai_plan(weeks, days):
+    """
+    A plan as the model would return it for `weeks` x `days`, valid
+    against validate_plan.
+    """
+
+    return {
+        "internship": {"domain": "Backend", "title": "Backend engineering internship",
+                       "durationWeeks": weeks, "daysPerWeek": days, "status": "planned"},
+        "weekly_plans": [
+            {"weekNumber": n, "learningObjectives": "Build and test a REST endpoint"}
+            for n in range(1, weeks + 1)
+        ],
+        "tasks": [
+            {"weekNumber": n, "title": f"Task {n}.{d}", "contentType": "coding" if d % 2 else "learning",
+             "description": "Implement the handler and cover it with tests. " * 4,
+             "expectedDeliverables": "A pull request", "estimatedHours": 3, "difficulty": "medium"}
+            for n in range(1, weeks + 1) for d in range(days)
+        ]
+    }
+
+
+@bench_cli.command("mongo")
+@click.option("--generations", default=200, show_default=True, help="Plans to generate and store per driver.")
+@click.option("--concurrency", default=16, show_default=True, help="Generations in flight at once.")
+@click.option("--weeks", default=2, show_default=True, help="Weeks per plan (kept below the chunked planner).")
+@click.option("--days", default=5, show_default=True, help="Tasks per week.")
+@click.option("--latency", default=0.05, show_default=True, help="Fake provider latency in seconds.")
+def bench_mongo_command(generations, concurrency, weeks, days, latency):
+    """
+    Plan generation throughput: generate_and_store against a fake
+    provider and the configured MongoDB, sync driver vs async driver.
+    """
+
+    import json
+    from bson import ObjectId
+    from app import db
+    from app.ai.generate import generate_plan
+    from app.internship_service import build_plan_documents, generate_and_store
+    from app.user_cache import INTERNSHIPS, user_cache
+
+    payload = {"domain": "Backend", "title": "Bench", "durationWeeks": weeks, "daysPerWeek": days,
+               "skills": [["python", "beginner"]]}
+    # Throwaway user: everything it owns is removed afterwards
+    user_id = str(ObjectId())
+
+    def _store_sync(internship, weeks_docs, tasks):
+        db.weekly_plans_col.insert_many(weeks_docs, ordered=True)
+        db.tasks_col.insert_many(tasks, ordered=True)
+        db.internships_col.insert_one(internship)
+
+    async def _sync(i):
+        # The pre-async path: blocking pymongo writes on the event loop
+        ai_output = await generate_plan(payload, bypass_cache=True)
+        _store_sync(*build_plan_documents(user_id, ai_output))
+        user_cache.invalidate(user_id, INTERNSHIPS)
+
+    async def _native(i):
+        await generate_and_store(user_id, payload, bypass_cache=True)
+
+    reply = json.dumps(_ai_plan(weeks, days))
+    try:
+        with _provider(True, latency) as server:
+            server.reply = reply
+            for label, call in (("sync driver", _sync), ("async driver", _native)):
+                # One untimed pass opens the pools
+                runtime.run(_measure(concurrency, concurrency, call))
+                elapsed, latencies = runtime.run(_measure(generations, concurrency, call))
+                _report(label, elapsed, latencies, unit="generations")
+    finally:
+        ids = [doc["_id"] for doc in db.internships_col.find({"userId": ObjectId(user_id)}, {"_id": 1})]
+        db.tasks_col.delete_many({"internshipId": {"$in": ids}})
+        db.weekly_plans_col.delete_many({"internshipId": {"$in": ids}})
+        db.internships_col.delete_many({"userId": ObjectId(user_id)})
+
+
+@bench_cli.command("login")
+@click.option("--logins", default=200, show_default=True, help="Verifications to run.")
+@click.option("--concurrency", default=8, show_default=True, help="Logins in flight at once.")
+def bench_login_command(logins, concurrency):
+    """Login (password verify) throughput with the configured method and pool."""
+
+    from app.passwords import PASSWORD_HASH_METHOD, PasswordServiceBusy, method_prefix, password_hasher
+
+    async def _bench():
+        stored = await password_hasher.hash("correct horse battery staple")
+        # Warm the pool so process start-up is not measured
+        await asyncio.gather(*(
+            password_hasher.verify(stored, "x") for _ in range(max(1, password_hasher.workers))
+        ))
+
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+        rejected = 0
+
+        async def _login():
+            nonlocal rejected
+            async with gate:
+                started = time.perf_counter()
+                try:
+                    await password_hasher.verify(stored, "correct horse battery staple")
+                except PasswordServiceBusy:
+                    rejected += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_login() for _ in range(logins)))
+        return time.perf_counter() - started, latencies, rejected
+
+    elapsed, latencies, rejected = runtime.run(_bench())
+    if not latencies:
+        raise click.ClickException(f"all {logins} logins rejected as busy")
+
+    _report(
+        f"{method_prefix(PASSWORD_HASH_METHOD)}, workers {password_hasher.workers or 'thread'}",
+        elapsed, latencies, unit="logins"
+    )
+    click.echo(f"  rejected {rejected}")
+
+
+@bench_cli.command("http")
+@click.argument("url")
+@click.option("--requests", "total", default=1000, show_default=True, help="Requests to send.")
+@click.option("--concurrency", default=32, show_default=True, help="Requests in flight at once.")
+@click.option("--method", default="GET", show_default=True)
+@click.option("--header", "-H", multiple=True, help="Extra header, 'Name: value'.")
+@click.option("--data", default=None, help="JSON request body.")
+def bench_http_command(url, total, concurrency, method, header, data):
+    """
+    Load-test a running server, e.g. the WSGI (gunicorn) and ASGI
+    (uvicorn asgi:app) entry points against the same route.
+    """
+
+    headers = dict(
+        (name.strip(), value.strip())
+        for name, _, value in (item.partition(":") for item in header)
+    )
+    if data is not None:
+        headers.setdefault("Content-Type", "application/json")
+
+    statuses = {}
+
+    async def _bench():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+
+            async def _request(i):
+                try:
+                    response = await client.request(method, url, headers=headers, content=data)
+                    status = response.status_code
+                except httpx.TransportError as e:
+                    status = type(e).__name__
+                statuses[status] = statuses.get(status, 0) + 1
+
+            return await _measure(total, concurrency, _request)
+
+    elapsed, latencies = runtime.run(_bench())
+    _report(f"{method} {url}", elapsed, latencies, unit="requests")
+    click.echo("  statuses " + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items(), key=str)))
+
+
+@bench_cli.command("feedback")
+@click.option("--submissions", default=64, show_default=True, help="Submissions to evaluate per path.")
+@click.option("--tasks", default=4, show_default=True, help="Distinct tasks the submissions are spread over.")
+@click.option("--window", default=0.2, show_default=True, help="Batch window in seconds.")
+@click.option("--latency", default=0.05, show_default=True, help="Fake provider latency in seconds.")
+def bench_feedback_command(submissions, tasks, window, latency):
+    """Submission feedback: one request per submission vs micro-batches."""
+
+    import json
+    import re
+    from app.ai import tokens
+    from app.ai.feedback import generate_feedback
+    from app.ai.feedback_batch import FEEDBACK_BATCH_MAX, FeedbackBatcher
+
+    feedback = {"strengths": ["Clear structure"], "weaknesses": ["No tests"],
+                "improvements": ["Add tests"], "recommendedNextSteps": ["Write unit tests"]}
+
+    def _reply(payload):
+        # Batched prompts get one result per submission marker
+        prompt = payload["messages"][-1]["content"]
+        ids = re.findall(r"^BEGIN SUBMISSION (\d+) ", prompt, re.M)
+        if ids:
+            return json.dumps({"results": [{"id": i, **feedback} for i in ids]})
+        return json.dumps(feedback)
+
+    def _payload(i):
+        task = i % tasks
+        return (task, {
+            "taskDescription": f"Task {task}: write a function named solve that parses a CSV line. " * 4,
+            # Unique code: the response cache must not answer
+            "submittedCode": f"def solve(line):\n    # attempt {i}\n    return line.split(',')\n"
+        })
+
+    batcher = FeedbackBatcher(window, FEEDBACK_BATCH_MAX)
+    spent = []
+
+    async def _single(i):
+        _, payload = _payload(i)
+        with tokens.tracking() as usage:
+            await generate_feedback(payload, bypass_cache=True)
+        spent.append(usage)
+
+    async def _batched(i):
+        task, payload = _payload(i)
+        with tokens.tracking() as usage:
+            await batcher.evaluate(task, payload, bypass_cache=True)
+        spent.append(usage)
+
+    with _provider(True, latency) as server:
+        server.reply = _reply
+        for label, call in (("one request per submission", _single), ("micro-batched", _batched)):
+            spent.clear()
+            sent = server.requests
+            # Every submission in flight at once, as a burst of submits would be
+            elapsed, latencies = runtime.run(_measure(submissions, submissions, call))
+            _report(label, elapsed, latencies, unit="submissions")
+            total = {key: sum(usage[key] for usage in spent) for key in ("promptTokens", "completionTokens")}
+            click.echo(f"  requests {server.requests - sent}")
+            click.echo(f"  tokens/submission  prompt {total['promptTokens'] / submissions:.0f}"
+                       f"  completion {total['completionTokens'] / submissions:.0f}")
+
+
+def _sample_plan(tasks):
+    """
+    An internship with its weeks and `tasks` tasks, shaped like the
+    documents the plan routes return.
+    """
+
+    from bson import ObjectId
+    from datetime import datetime
+
+    now = datetime.utcnow()
+    internship_id = ObjectId()
+    weeks = [
+        {"_id": ObjectId(), "internshipId": internship_id, "weekNumber": n,
+         "learningObjectives": "Build and test a REST endpoint " * 4, "createdAt": now}
+        for n in range(1, max(1, tasks // 5) + 1)
+    ]
+    return {
+        "_id": internship_id,
+        "userId": ObjectId(),
+        "title": "Backend engineering internship",
+        "status": "planned",
+        "createdAt": now,
+        "weeks": weeks,
+        "tasks": [
+            {"_id": ObjectId(), "internshipId": internship_id, "weekId": weeks[i % len(weeks)]["_id"],
+             "title": f"Task {i}", "contentType": "coding" if i % 2 else "learning",
+             "description": "Implement the handler and cover it with tests. " * 8,
+             "expectedDeliverables": "A pull request", "estimatedHours": 3,
+             "difficulty": "medium", "createdAt": now}
+            for i in range(tasks)
+        ]
+    }
+
+
+def _stringify_ids(doc):
+    # The pre-provider path: hand-written ObjectId loops before jsonify
+    from bson import ObjectId
+
+    out = {}
+    for key, value in doc.items():
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, list):
+            value = [_stringify_ids(v) if isinstance(v, dict) else v for v in value]
+        out[key] = value
+    return out
+
+
+@bench_cli.command("json")
+@click.option("--tasks", default=60, show_default=True, help="Tasks in the sample plan.")
+@click.option("--rounds", default=500, show_default=True, help="Responses to serialize per provider.")
+def bench_json_command(tasks, rounds):
+    """Serialize a full plan response: Flask's default provider vs the app's."""
+
+    from flask import current_app
+    from flask.json.provider import DefaultJSONProvider
+    from app.json_provider import BSONJSONProvider, OrjsonProvider, orjson
+
+    app = current_app._get_current_object()
+    plan = _sample_plan(tasks)
+
+    def _default():
+        return DefaultJSONProvider(app).response(_stringify_ids(plan))
+
+    candidates = [
+        ("flask default + id loop", _default),
+        ("stdlib BSON provider", lambda: BSONJSONProvider(app).response(plan))
+    ]
+    if orjson:
+        candidates.append(("orjson provider", lambda: OrjsonProvider(app).response(plan)))
+
+    for label, build in candidates:
+        size = len(build().get_data())
+        latencies = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            build()
+            latencies.append(time.perf_counter() - started)
+        _report(label, sum(latencies), latencies, unit="responses")
+        click.echo(f"  bytes    {size}")
+
+
+@bench_cli.command("internship")
+@click.option("--weeks", default=12, show_default=True, help="Weeks in the seeded plan.")
+@click.option("--days", default=5, show_default=True, help="Tasks per week.")
+@click.option("--rounds", default=200, show_default=True, help="Full plans to read per path.")
+def bench_internship_command(weeks, days, rounds):
+    """Read a full plan: per-week round trips vs the /full aggregation."""
+
+    from app.db import internships_col, tasks_col, weekly_plans_col
+    from app.internships import TASK_SUMMARY_EXCLUDE, full_internship_pipeline
+
+    # Seeded under a throwaway user and removed afterwards
+    plan = _sample_plan(weeks * days)
+    user_id = plan["userId"]
+    iid = plan["_id"]
+    internships_col.insert_one({k: v for k, v in plan.items() if k not in ("weeks", "tasks")})
+    weekly_plans_col.insert_many(plan["weeks"])
+    tasks_col.insert_many(plan["tasks"])
+
+    summary = {f: 0 for f in TASK_SUMMARY_EXCLUDE}
+
+    def _round_trips():
+        # What a client did before /full: internship, /weeks, /tasks?week=N
+        internships_col.find_one({"_id": iid, "userId": user_id})
+        for week in weekly_plans_col.find({"internshipId": iid}).sort("weekNumber", 1):
+            list(tasks_col.find({"internshipId": iid, "weekId": week["_id"]}, summary).sort("_id", 1))
+
+    def _aggregate():
+        list(internships_col.aggregate(full_internship_pipeline(iid, user_id)))
+
+    try:
+        for label, read in (("per-week round trips", _round_trips), ("one aggregation", _aggregate)):
+            read()
+            latencies = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                read()
+                latencies.append(time.perf_counter() - started)
+            _report(label, sum(latencies), latencies, unit="plans")
+    finally:
+        tasks_col.delete_many({"internshipId": iid})
+        weekly_plans_col.delete_many({"internshipId": iid})
+        internships_col.delete_one({"_id": iid})
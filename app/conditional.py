@@ -0,0 +1,51 @@
+from flask import make_response, request
+from datetime import datetime
+import hashlib
+
+# Single documents that are never modified once written (tasks, feedback)
+IMMUTABLE = "private, max-age=86400, immutable"
+# Anything that can still change: clients must revalidate with the ETag
+REVALIDATE = "private, no-cache"
+
+
+# What _version() reads: list projections always include these
+VERSION_FIELDS = ("updatedAt", "createdAt", "status")
+
+
+def _version(doc) -> str:
+    stamp = doc.get("updatedAt") or doc.get("createdAt")
+    if isinstance(stamp, datetime):
+        stamp = stamp.isoformat()
+    return f"{doc.get('_id')}:{stamp}:{doc.get('status', '')}"
+
+
+def etag_for(docs, *extra) -> str:
+    """
+    Strong validator for a response built from `docs`: their ids, update
+    timestamps and statuses, plus the request path and query string
+    (projections and cursors change the body). The body itself is never
+    hashed.
+    """
+
+    h = hashlib.sha1(request.full_path.encode("utf-8"))
+    for part in (*extra, *(_version(d) for d in docs)):
+        h.update(b"\0")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def conditional(etag, build, cache_control=REVALIDATE):
+    """
+    Answers 304 when If-None-Match already has `etag` (or is `*`: the
+    caller only gets here for a resource that exists); otherwise calls
+    `build()` (anything a view may return) and tags the response.
+    """
+
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
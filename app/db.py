@@ -1,5 +1,6 @@
 import os
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, IndexModel, ASCENDING
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,25 +14,186 @@ if not MONGO_URI:
 if not DB_NAME:
     raise RuntimeError("DB_NAME not set")
 
-client = MongoClient(
-    MONGO_URI,
-    serverSelectionTimeoutMS=5000
-)
 
-# Check connection
-client.admin.command("ping")
+def _optional_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
 
-db = client[DB_NAME]
-users_col = db.users
-user_skills_col = db.user_skills
-internships_col = db.internships
-weekly_plans_col = db.weekly_plans
-tasks_col = db.tasks
 
-submissions_col = db.submissions      # ✅ REQUIRED
-feedback_col = db.feedback            # ✅ REQUIRED
-feedback_col.create_index("submissionId", unique=True)
+# Connection pool, per client (one sync + one async client per worker process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = _optional_int("MONGO_MAX_IDLE_TIME_MS")
+# How long a request may wait for a free pooled connection (unset: no limit)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
 
 
+def client_options() -> dict:
+    """
+    Pool and timeout settings shared by the sync and async clients.
+    """
 
-print(f"✅ MongoDB connected: {DB_NAME}")
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS
+    }
+    if MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    return options
+
+
+class Connection:
+    """
+    One MongoClient per process, created on first use.
+
+    Nothing touches the network at import, and a client inherited from
+    a pre-fork master is never reused: the child builds its own (pymongo
+    clients are not fork-safe).
+    """
+
+    def __init__(self):
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def client(self) -> MongoClient:
+        if self._client is not None and self._pid == os.getpid():
+            return self._client
+
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                # The parent's client is left alone: closing it here would
+                # tear down sockets the parent still owns
+                self._client = MongoClient(MONGO_URI, connect=False, **client_options())
+                self._pid = os.getpid()
+
+        return self._client
+
+    def ping(self):
+        """
+        Raises (pymongo error) when the server cannot be reached.
+        """
+
+        self.client().admin.command("ping")
+
+
+connection = Connection()
+
+
+def get_client() -> MongoClient:
+    return connection.client()
+
+
+def get_db():
+    return connection.client()[DB_NAME]
+
+
+class LazyHandle:
+    """
+    Stand-in for the database (`collection=None`) or one collection,
+    resolved against the current process's client on use, so
+    `from app.db import users_col` stays valid at import and across fork.
+    """
+
+    def __init__(self, collection=None):
+        self._collection = collection
+        self._client = None
+        self._target = None
+
+    def _resolve(self):
+        client = connection.client()
+        if self._client is not client:
+            database = client[DB_NAME]
+            self._target = database if self._collection is None else database[self._collection]
+            self._client = client
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+    def __repr__(self):
+        return f"LazyHandle({DB_NAME}.{self._collection or '*'})"
+
+
+db = LazyHandle()
+users_col = LazyHandle("users")
+user_skills_col = LazyHandle("user_skills")
+internships_col = LazyHandle("internships")
+weekly_plans_col = LazyHandle("weekly_plans")
+tasks_col = LazyHandle("tasks")
+
+submissions_col = LazyHandle("submissions")      # ✅ REQUIRED
+feedback_col = LazyHandle("feedback")            # ✅ REQUIRED
+
+llm_cache_col = LazyHandle("llm_cache")          # shared LLM response cache
+jobs_col = LazyHandle("jobs")                    # background job queue
+revoked_tokens_col = LazyHandle("revoked_tokens")  # JWT revocation list
+cache_generations_col = LazyHandle("cache_generations")  # user cache invalidation
+
+
+# Indexes backing every query the blueprints/services run.
+# Applied at deploy time with `flask indexes ensure` (see app/indexes.py),
+# never at import.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True)
+    ],
+    "user_skills": [
+        IndexModel([("userId", ASCENDING), ("_id", ASCENDING)], name="userId_id")
+    ],
+    "internships": [
+        IndexModel([("userId", ASCENDING), ("_id", ASCENDING)], name="userId_id")
+    ],
+    "weekly_plans": [
+        IndexModel(
+            [("internshipId", ASCENDING), ("weekNumber", ASCENDING)],
+            name="internshipId_weekNumber",
+            unique=True
+        )
+    ],
+    "tasks": [
+        IndexModel([("internshipId", ASCENDING), ("_id", ASCENDING)], name="internshipId_id"),
+        IndexModel(
+            [("internshipId", ASCENDING), ("weekId", ASCENDING), ("_id", ASCENDING)],
+            name="internshipId_weekId_id"
+        )
+    ],
+    "submissions": [
+        IndexModel(
+            [("taskId", ASCENDING), ("userId", ASCENDING), ("_id", ASCENDING)],
+            name="taskId_userId_id"
+        )
+    ],
+    "feedback": [
+        IndexModel([("submissionId", ASCENDING)], name="submissionId_unique", unique=True)
+    ],
+    "llm_cache": [
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0)
+    ],
+    "cache_generations": [
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt")
+    ],
+    "revoked_tokens": [
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+        IndexModel([("revokedAt", ASCENDING)], name="revokedAt")
+    ],
+    "jobs": [
+        IndexModel(
+            [("status", ASCENDING), ("type", ASCENDING), ("runAt", ASCENDING)],
+            name="status_type_runAt"
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("heartbeatAt", ASCENDING)],
+            name="status_heartbeatAt"
+        )
+    ]
+}
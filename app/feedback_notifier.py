@@ -0,0 +1,172 @@
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+import asyncio
+import os
+import threading
+import traceback
+
+from app import async_db, metrics
+from app.runtime import runtime
+
+load_dotenv()
+
+# Upper bounds for ?wait= on GET /submissions/<id>/feedback. A parked
+# request holds its handler thread: one of ASGI_THREADS under asgi.py,
+# a whole sync worker thread under plain WSGI
+FEEDBACK_WAIT_MAX = float(os.getenv("FEEDBACK_WAIT_MAX", "30"))
+FEEDBACK_WAIT_MAX_WSGI = float(os.getenv("FEEDBACK_WAIT_MAX_WSGI", "10"))
+# Follow feedback inserts with a change stream (needs a replica set)
+FEEDBACK_CHANGE_STREAM = os.getenv("FEEDBACK_CHANGE_STREAM", "1") == "1"
+# Without change streams: one batched lookup for all waiters this often
+FEEDBACK_POLL_INTERVAL = float(os.getenv("FEEDBACK_POLL_INTERVAL", "2"))
+
+
+class FeedbackNotifier:
+    """
+    Parks requests until the feedback for a submission exists.
+
+    Waiters are woken when the feedback is stored or the evaluation
+    fails, by, in order of preference:
+    - a change stream on `feedback` inserts and submissions turning
+      "failed" (any worker's writes)
+    - publish() from evaluate_submission / mark_failed in this process
+    - without change streams, one `$in` lookup per collection per
+      interval covering every parked waiter of the process
+
+    Lives on the runtime loop, like the job worker.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._waiters = {}  # submissionId -> set of futures
+        self._lock = threading.Lock()
+        self.mode = None
+
+        self.stats = {
+            "waits": 0,
+            "wakes": 0,
+            "timeouts": 0
+        }
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._waiters = {}
+            self.mode = "changeStream" if FEEDBACK_CHANGE_STREAM else "poll"
+            runtime.spawn(self._main())
+
+    def publish(self, submission_id):
+        """
+        Wakes everyone waiting on `submission_id` (feedback stored, or the
+        evaluation gave up). Must be called on the runtime loop.
+        """
+
+        for future in self._waiters.pop(submission_id, ()):
+            if not future.done():
+                future.set_result(None)
+                self.stats["wakes"] += 1
+
+    async def wait(self, submission_id, timeout):
+        """
+        Returns the feedback document, or None if it did not appear
+        within `timeout` seconds or the evaluation failed meanwhile.
+        """
+
+        self.ensure_started()
+        self.stats["waits"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(submission_id, set()).add(future)
+
+        try:
+            # Checked after registering so an insert in between still wakes us
+            feedback = await async_db.feedback_col.find_one({"submissionId": submission_id})
+            if feedback:
+                return feedback
+
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                return None
+
+            return await async_db.feedback_col.find_one({"submissionId": submission_id})
+        finally:
+            waiters = self._waiters.get(submission_id)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[submission_id]
+
+    async def _main(self):
+        while True:
+            try:
+                # Also catches inserts missed while the stream was down
+                await self._sweep()
+
+                if self.mode == "changeStream":
+                    await self._follow_changes()
+                else:
+                    await asyncio.sleep(FEEDBACK_POLL_INTERVAL)
+            except OperationFailure as e:
+                # Standalone server: change streams are not available
+                print(f"Feedback change stream unavailable, polling instead: {e}")
+                self.mode = "poll"
+            except Exception:
+                traceback.print_exc()
+                await asyncio.sleep(FEEDBACK_POLL_INTERVAL)
+
+    async def _follow_changes(self):
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": "feedback", "operationType": "insert"},
+            {
+                "ns.coll": "submissions",
+                "operationType": "update",
+                "updateDescription.updatedFields.status": "failed"
+            }
+        ]}}]
+
+        async with await async_db.get_db().watch(pipeline) as stream:
+            async for change in stream:
+                if change["ns"]["coll"] == "feedback":
+                    self.publish(change["fullDocument"]["submissionId"])
+                else:
+                    self.publish(change["documentKey"]["_id"])
+
+    async def _sweep(self):
+        if not self._waiters:
+            return
+
+        waiting = list(self._waiters)
+
+        cursor = async_db.feedback_col.find(
+            {"submissionId": {"$in": waiting}},
+            {"submissionId": 1}
+        )
+        async for doc in cursor:
+            self.publish(doc["submissionId"])
+
+        cursor = async_db.submissions_col.find(
+            {"_id": {"$in": waiting}, "status": "failed"},
+            {"_id": 1}
+        )
+        async for doc in cursor:
+            self.publish(doc["_id"])
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "waiting": sum(len(w) for w in self._waiters.values()),
+            "mode": self.mode
+        }
+
+
+feedback_notifier = FeedbackNotifier()
+
+metrics.register("feedbackWaits", feedback_notifier.snapshot)
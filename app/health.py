@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify
+from pymongo.errors import PyMongoError
+
+from app.db import connection
+
+health_bp = Blueprint("health", __name__)
+
+
+@health_bp.route("/live", methods=["GET"])
+def live():
+    # The process is up and serving; says nothing about its dependencies
+    return jsonify({"status": "ok"}), 200
+
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe: 200 once this worker can reach MongoDB, 503 until
+    then. Replaces the old connect-and-ping at import.
+    """
+
+    try:
+        connection.ping()
+    except PyMongoError as e:
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+
+    return jsonify({"status": "ready"}), 200
@@ -0,0 +1,178 @@
+import click
+from bson import ObjectId
+from flask.cli import AppGroup
+
+from app.db import db, INDEXES
+
+indexes_cli = AppGroup("indexes", help="Manage MongoDB indexes.")
+
+# Options that make two indexes on the same keys different
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Query shapes issued by the routes/services: (route, collection, filter, sort)
+ROUTE_QUERIES = [
+    ("POST /auth/register", "users", {"email": "x@example.com"}, None),
+    ("POST /auth/login", "users", {"email": "x@example.com"}, None),
+    ("GET /users/skills", "user_skills", {"userId": ObjectId()}, [("_id", 1)]),
+    ("DELETE /users/skills/<id>", "user_skills", {"_id": ObjectId(), "userId": ObjectId()}, None),
+    ("GET /internships", "internships", {"userId": ObjectId()}, [("_id", 1)]),
+    ("GET /internships/<id>", "internships", {"_id": ObjectId(), "userId": ObjectId()}, None),
+    ("GET /internships/<id>/weeks", "weekly_plans", {"internshipId": ObjectId()}, [("weekNumber", 1)]),
+    ("GET /internships/<id>/tasks?week", "weekly_plans", {"internshipId": ObjectId(), "weekNumber": 1}, None),
+    ("GET /internships/<id>/tasks", "tasks", {"internshipId": ObjectId()}, [("_id", 1)]),
+    ("GET /internships/<id>/tasks?week", "tasks", {"internshipId": ObjectId(), "weekId": ObjectId()}, [("_id", 1)]),
+    ("GET /internships/<id>/full $lookup", "weekly_plans", {"internshipId": ObjectId()}, [("weekNumber", 1)]),
+    ("GET /internships/<id>/full $lookup", "tasks", {"internshipId": ObjectId()}, [("_id", 1)]),
+    ("GET /internships/<id>/tasks/<id>", "tasks", {"_id": ObjectId(), "internshipId": ObjectId()}, None),
+    ("GET /internships/jobs/<id>", "jobs", {"_id": ObjectId(), "userId": ObjectId()}, None),
+    ("GET /submissions/<id>/feedback", "feedback", {"submissionId": ObjectId()}, None),
+    ("GET /submissions/tasks/<id>/submissions", "submissions", {"taskId": ObjectId(), "userId": ObjectId()}, [("_id", 1)]),
+    ("token revocation sync", "revoked_tokens", {"revokedAt": {"$gte": 0}}, None),
+    ("user cache generation sync", "cache_generations", {"updatedAt": {"$gte": 0}}, None),
+    ("job queue: claim", "jobs", {"type": "x", "status": "queued", "runAt": {"$lte": 0}}, [("runAt", 1)]),
+    ("job queue: stale recovery", "jobs", {"status": "running", "heartbeatAt": {"$lt": 0}}, None),
+]
+
+
+def _key_of(key) -> tuple:
+    """
+    Normalizes IndexModel keys (mapping) and index_information() keys
+    (list of pairs, directions sometimes returned as floats).
+    """
+
+    pairs = key.items() if hasattr(key, "items") else key
+    return tuple(
+        (field, int(direction) if isinstance(direction, float) else direction)
+        for field, direction in pairs
+    )
+
+
+def _options_of(spec) -> dict:
+    return {k: spec[k] for k in INDEX_OPTIONS if k in spec}
+
+
+def reconcile_indexes(dry_run=False, prune=False):
+    """
+    Brings every collection's indexes in line with app.db.INDEXES.
+    Safe to run repeatedly: matching indexes are left alone.
+
+    Returns a list of (collection, action, index name) tuples.
+    """
+
+    actions = []
+
+    for collection, models in INDEXES.items():
+        col = db[collection]
+        existing = col.index_information()
+        wanted = {m.document["name"]: m for m in models}
+
+        to_create = []
+
+        for name, model in wanted.items():
+            spec = model.document
+            current = existing.get(name)
+
+            if current is None:
+                # Same keys under another name would make create_index fail
+                for other_name, other in existing.items():
+                    if other_name != "_id_" and _key_of(other["key"]) == _key_of(spec["key"]):
+                        actions.append((collection, "drop", other_name))
+                        if not dry_run:
+                            col.drop_index(other_name)
+                to_create.append(model)
+                actions.append((collection, "create", name))
+
+            elif _key_of(current["key"]) != _key_of(spec["key"]) or _options_of(current) != _options_of(spec):
+                actions.append((collection, "rebuild", name))
+                if not dry_run:
+                    col.drop_index(name)
+                to_create.append(model)
+
+        if prune:
+            for name in existing:
+                if name != "_id_" and name not in wanted:
+                    actions.append((collection, "drop", name))
+                    if not dry_run:
+                        col.drop_index(name)
+
+        if to_create and not dry_run:
+            col.create_indexes(to_create)
+
+    return actions
+
+
+def _stages(plan):
+    """
+    Yields every stage name of an explain() plan tree.
+    """
+
+    # Slot-based engine nests the classic tree under queryPlan
+    plan = plan.get("queryPlan", plan)
+    yield plan.get("stage")
+
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def coverage_report():
+    """
+    Explains each query in ROUTE_QUERIES and flags the ones the winning
+    plan answers with a collection scan or an in-memory sort.
+    """
+
+    report = []
+
+    for route, collection, query, sort in ROUTE_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = set(_stages(plan))
+
+        problems = []
+        if "COLLSCAN" in stages:
+            problems.append("collection scan")
+        if "SORT" in stages:
+            problems.append("in-memory sort")
+
+        report.append({
+            "route": route,
+            "collection": collection,
+            "filter": sorted(query),
+            "covered": not problems,
+            "problems": problems
+        })
+
+    return report
+
+
+@indexes_cli.command("ensure")
+@click.option("--dry-run", is_flag=True, help="Only print what would change.")
+@click.option("--prune", is_flag=True, help="Drop indexes that are not declared.")
+def ensure_command(dry_run, prune):
+    """Create/rebuild the indexes declared in app.db.INDEXES."""
+
+    actions = reconcile_indexes(dry_run=dry_run, prune=prune)
+
+    if not actions:
+        click.echo("Indexes up to date")
+    for collection, action, name in actions:
+        click.echo(f"{action:8} {collection}.{name}")
+
+
+@indexes_cli.command("report")
+def report_command():
+    """List route queries that are not backed by an index."""
+
+    uncovered = 0
+
+    for row in coverage_report():
+        status = "ok" if row["covered"] else ", ".join(row["problems"])
+        if not row["covered"]:
+            uncovered += 1
+        click.echo(f"{status:28} {row['route']}  ({row['collection']} {row['filter']})")
+
+    click.echo(f"{uncovered} uncovered quer{'y' if uncovered == 1 else 'ies'}")
@@ -1,30 +1,56 @@
 from bson import ObjectId
-from app.ai.generate import generate_plan
-from app.db import internships_col, weekly_plans_col, tasks_col
+from app.ai.generate import generate_plan, build_plan_prompt, internship_agent
+from app.ai.planner import generate_plan_chunked, use_chunked_planner
+from app.ai.stream_parser import PlanStreamParser
+from app import async_db
+from app.job_service import register
+from app.user_cache import user_cache, INTERNSHIPS
+from app.schemas import AI_INTERNSHIP, AI_TASK, AI_WEEK, SchemaError
 from datetime import datetime
+from dotenv import load_dotenv
+import os
 
-async def generate_and_store(user_id, payload):
-    ai_output = await generate_plan(payload)
+load_dotenv()
 
-    internship_id = internships_col.insert_one({
+# Multi-document transactions need a replica set / mongos
+MONGO_TRANSACTIONS = os.getenv("MONGO_TRANSACTIONS", "0") == "1"
+
+
+def build_plan_documents(user_id, ai_output):
+    """
+    Turns AI output into ready-to-insert documents.
+    ObjectIds are allocated client-side so week ids are known up front.
+    """
+
+    now = datetime.utcnow()
+    internship_id = ObjectId()
+
+    internship = {
+        "_id": internship_id,
         "userId": ObjectId(user_id),
         **ai_output["internship"],
-        "createdAt": datetime.utcnow()
-    }).inserted_id
+        "createdAt": now
+    }
 
+    weeks = []
     week_id_map = {}
 
     for w in ai_output["weekly_plans"]:
-        res = weekly_plans_col.insert_one({
+        week_id = ObjectId()
+        week_id_map[w["weekNumber"]] = week_id
+        weeks.append({
+            "_id": week_id,
             "internshipId": internship_id,
             "weekNumber": w["weekNumber"],
             "learningObjectives": w["learningObjectives"],
-            "createdAt": datetime.utcnow()
+            "createdAt": now
         })
-        week_id_map[w["weekNumber"]] = res.inserted_id
+
+    tasks = []
 
     for t in ai_output["tasks"]:
-        tasks_col.insert_one({
+        tasks.append({
+            "_id": ObjectId(),
             "internshipId": internship_id,
             "weekId": week_id_map[t["weekNumber"]],
             "title": t["title"],
@@ -33,7 +59,179 @@ async def generate_and_store(user_id, payload):
             "expectedDeliverables": t["expectedDeliverables"],
             "estimatedHours": t["estimatedHours"],
             "difficulty": t["difficulty"],
-            "createdAt": datetime.utcnow()
+            "createdAt": now
         })
 
-    return internship_id, ai_output
+    return internship, weeks, tasks
+
+
+async def write_plan(internship, weeks, tasks, session=None):
+    """
+    Three ordered batches regardless of plan size.
+    The internship goes in last: until it exists, no API route can
+    reach the weeks and tasks that reference it.
+    """
+
+    if weeks:
+        await async_db.weekly_plans_col.insert_many(weeks, ordered=True, session=session)
+    if tasks:
+        await async_db.tasks_col.insert_many(tasks, ordered=True, session=session)
+    await async_db.internships_col.insert_one(internship, session=session)
+
+
+async def store_plan(internship, weeks, tasks):
+    if MONGO_TRANSACTIONS:
+        async with async_db.get_client().start_session() as session:
+            await session.with_transaction(
+                lambda s: write_plan(internship, weeks, tasks, session=s)
+            )
+        return
+
+    try:
+        await write_plan(internship, weeks, tasks)
+    except Exception:
+        # Don't leave orphaned weeks/tasks behind
+        await async_db.weekly_plans_col.delete_many({"internshipId": internship["_id"]})
+        await async_db.tasks_col.delete_many({"internshipId": internship["_id"]})
+        raise
+
+
+async def generate_and_store(user_id, payload, bypass_cache=False):
+    # Long plans: skeleton + per-week chunks generated in parallel
+    planner = generate_plan_chunked if use_chunked_planner(payload) else generate_plan
+    ai_output = await planner(payload, bypass_cache=bypass_cache)
+
+    internship, weeks, tasks = build_plan_documents(user_id, ai_output)
+    await store_plan(internship, weeks, tasks)
+    await user_cache.ainvalidate(user_id, INTERNSHIPS)
+
+    return internship["_id"], ai_output
+
+
+async def stream_and_store(user_id, payload, bypass_cache=False):
+    """
+    Streaming variant of generate_and_store.
+
+    Async generator yielding (event, data) pairs as the model produces
+    the plan; each week and task is stored before it is yielded.
+    The internship is marked "generating" until the stream completes,
+    and everything written is removed if the stream fails midway.
+    """
+
+    internship_id = ObjectId()
+    week_id_map = {}
+    final_status = "planned"
+    counts = {"internship": 0, "week": 0, "task": 0}
+    completed = False
+
+    parser = PlanStreamParser()
+    stream = internship_agent.stream(build_plan_prompt(payload), bypass_cache=bypass_cache)
+
+    try:
+        async for fragment in stream:
+            for kind, item in parser.feed(fragment):
+                now = datetime.utcnow()
+
+                # Each element is checked before it is written
+                if kind == "internship":
+                    AI_INTERNSHIP.validate(item)
+                    final_status = item.get("status", final_status)
+                    doc = {
+                        "_id": internship_id,
+                        "userId": ObjectId(user_id),
+                        **item,
+                        "status": "generating",
+                        "createdAt": now
+                    }
+                    await async_db.internships_col.insert_one(doc)
+                    await user_cache.ainvalidate(user_id, INTERNSHIPS)
+                    yield "internship", {**doc, "status": final_status}
+
+                elif kind == "week":
+                    AI_WEEK.validate(item)
+                    doc = {
+                        "_id": ObjectId(),
+                        "internshipId": internship_id,
+                        "weekNumber": item["weekNumber"],
+                        "learningObjectives": item["learningObjectives"],
+                        "createdAt": now
+                    }
+                    week_id_map[item["weekNumber"]] = doc["_id"]
+                    await async_db.weekly_plans_col.insert_one(doc)
+                    yield "week", doc
+
+                else:
+                    AI_TASK.validate(item)
+                    if item["weekNumber"] not in week_id_map:
+                        raise RuntimeError(
+                            f"AI output task references unknown week {item['weekNumber']}"
+                        )
+                    doc = {
+                        "_id": ObjectId(),
+                        "internshipId": internship_id,
+                        "weekId": week_id_map[item["weekNumber"]],
+                        "title": item["title"],
+                        "contentType": item["contentType"],
+                        "description": item["description"],
+                        "expectedDeliverables": item["expectedDeliverables"],
+                        "estimatedHours": item["estimatedHours"],
+                        "difficulty": item["difficulty"],
+                        "createdAt": now
+                    }
+                    await async_db.tasks_col.insert_one(doc)
+                    yield "task", doc
+
+                counts[kind] += 1
+
+        if not parser.done or not counts["internship"]:
+            raise RuntimeError("AI stream ended before the plan was complete")
+
+        # Every element validated on its own; the plan as a whole must be complete too
+        weeks, days = int(payload["durationWeeks"]), int(payload["daysPerWeek"])
+        if counts["week"] != weeks or counts["task"] != weeks * days:
+            raise SchemaError(
+                "AI plan",
+                "",
+                f"has {counts['week']} weeks and {counts['task']} tasks, "
+                f"expected {weeks} and {weeks * days}"
+            )
+
+        await async_db.internships_col.update_one(
+            {"_id": internship_id},
+            {"$set": {"status": final_status}}
+        )
+        completed = True
+
+        yield "done", {
+            "internshipId": internship_id,
+            "weeks": counts["week"],
+            "tasks": counts["task"]
+        }
+
+    finally:
+        await stream.aclose()
+
+        if not completed:
+            await internship_agent.forget(build_plan_prompt(payload))
+            await async_db.internships_col.delete_one({"_id": internship_id})
+            await async_db.weekly_plans_col.delete_many({"internshipId": internship_id})
+            await async_db.tasks_col.delete_many({"internshipId": internship_id})
+
+        # Final status, or the cleanup above
+        await user_cache.ainvalidate(user_id, INTERNSHIPS)
+
+
+@register("generate_internship")
+async def run_generation_job(job):
+    internship_id, output = await generate_and_store(
+        str(job["userId"]),
+        job["payload"],
+        bypass_cache=job["options"].get("bypassCache", False)
+    )
+
+    return {
+        "internshipId": str(internship_id),
+        "internship": output["internship"],
+        "weeklyPlans": output["weekly_plans"],
+        "tasks": output["tasks"]
+    }
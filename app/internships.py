@@ -1,15 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime
-import asyncio
 
-from app.internship_service import generate_and_store
 from app.db import internships_col, weekly_plans_col, tasks_col
+from app.job_service import enqueue, get_job
+from app.pagination import PageError, paginate, page_response
+from app.conditional import IMMUTABLE, conditional, etag_for
+from app.schemas import GENERATE_REQUEST
+from app.internship_service import stream_and_store
+from app.runtime import runtime
+from app.user_cache import user_cache, INTERNSHIPS
 
 internships_bp = Blueprint("internships", __name__)
 
-ALLOWED_LEVELS = {"beginner", "intermediate", "advanced"}
+# Large LLM-written fields left out of task list views unless requested
+TASK_SUMMARY_EXCLUDE = ("description", "expectedDeliverables")
 
 def to_object_id(value):
     try:
@@ -18,36 +24,149 @@ def to_object_id(value):
         return None
 
 
+def owns_internship(iid, user_id):
+    return internships_col.find_one(
+        {"_id": iid, "userId": ObjectId(user_id)},
+        {"_id": 1}
+    ) is not None
+
+
+def full_internship_pipeline(iid, user_id, include_text=False):
+    """
+    Internship with its weeks (by weekNumber) and each week's tasks
+    nested, in one round trip. Requires MongoDB 5.0+ ($lookup with both
+    localField and pipeline).
+    """
+
+    task_projection = {"internshipId": 0}
+    if not include_text:
+        task_projection.update({f: 0 for f in TASK_SUMMARY_EXCLUDE})
+
+    return [
+        {"$match": {"_id": iid, "userId": user_id}},
+        {"$lookup": {
+            "from": "weekly_plans",
+            "localField": "_id",
+            "foreignField": "internshipId",
+            "pipeline": [
+                {"$sort": {"weekNumber": 1}},
+                {"$project": {"internshipId": 0}}
+            ],
+            "as": "weeks"
+        }},
+        {"$lookup": {
+            "from": "tasks",
+            "localField": "_id",
+            "foreignField": "internshipId",
+            "pipeline": [
+                {"$sort": {"_id": 1}},
+                {"$project": task_projection}
+            ],
+            "as": "tasks"
+        }},
+        {"$set": {
+            "weeks": {"$map": {
+                "input": "$weeks",
+                "as": "w",
+                "in": {"$mergeObjects": [
+                    "$$w",
+                    {"tasks": {"$filter": {
+                        "input": "$tasks",
+                        "as": "t",
+                        "cond": {"$eq": ["$$t.weekId", "$$w._id"]}
+                    }}}
+                ]}
+            }}
+        }},
+        {"$unset": "tasks"}
+    ]
+
+
 @internships_bp.route("/generate", methods=["POST"])
 @jwt_required()
 def generate_internship():
     user_id = get_jwt_identity()
     payload = request.json or {}
 
-    required = ["domain", "title", "durationWeeks", "daysPerWeek", "skills"]
-    for r in required:
-        if r not in payload:
-            return jsonify({"error": f"{r} is required"}), 400
-
-    for s in payload["skills"]:
-        if not isinstance(s, list) or len(s) != 2 or s[1] not in ALLOWED_LEVELS:
-            return jsonify({
-                "error": "skills must be [['skill', 'beginner|intermediate|advanced']]"
-            }), 400
-
-    # Flask-safe async execution
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    internship_id, output = loop.run_until_complete(
-        generate_and_store(user_id, payload)
+    error = GENERATE_REQUEST.error(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    job_id = enqueue(
+        "generate_internship",
+        user_id,
+        payload,
+        options={"bypassCache": request.args.get("nocache") == "1"}
     )
 
     return jsonify({
-        "internshipId": str(internship_id),
-        "internship": output["internship"],
-        "weeklyPlans": output["weekly_plans"],
-        "tasks": output["tasks"]
-    }), 200
+        "jobId": str(job_id),
+        "status": "queued"
+    }), 202
+
+
+@internships_bp.route("/generate/stream", methods=["POST"])
+@jwt_required()
+def generate_internship_stream():
+    """
+    Server-Sent Events: `internship`, then `week` and `task` events as
+    each one is generated and stored, then `done` (or `error`).
+    """
+
+    user_id = get_jwt_identity()
+    payload = request.json or {}
+
+    error = GENERATE_REQUEST.error(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    events = stream_and_store(
+        user_id,
+        payload,
+        bypass_cache=request.args.get("nocache") == "1"
+    )
+
+    def sse():
+        try:
+            for event, data in runtime.iterate(events):
+                yield f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {current_app.json.dumps({'error': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(sse()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@internships_bp.route("/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+async def get_generation_job(job_id):
+    jid = to_object_id(job_id)
+    if not jid:
+        return jsonify({"error": "Invalid job id"}), 400
+
+    job = await get_job(jid, get_jwt_identity())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    response = {
+        "jobId": str(job["_id"]),
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "createdAt": job["createdAt"]
+    }
+
+    if job["status"] == "done":
+        response["result"] = job["result"]
+    elif job.get("error"):
+        response["error"] = job["error"]
+
+    return jsonify(response), 200
 
 
 @internships_bp.route("", methods=["GET"])
@@ -56,13 +175,20 @@ def get_internships():
     user_id = get_jwt_identity()
     uid = ObjectId(user_id)
 
-    internships = []
-    for i in internships_col.find({"userId": uid}):
-        i["_id"] = str(i["_id"])
-        i["userId"] = str(i["userId"])
-        internships.append(i)
-
-    return jsonify(internships), 200
+    try:
+        internships, next_cursor = user_cache.get_or_load(
+            user_id,
+            INTERNSHIPS,
+            lambda: paginate(internships_col, {"userId": uid}),
+            variant=request.query_string.decode()
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return conditional(
+        etag_for(internships),
+        lambda: page_response(internships, next_cursor)
+    )
 
 
 @internships_bp.route("/<internship_id>", methods=["GET"])
@@ -82,11 +208,39 @@ def get_internship(internship_id):
     if not internship:
         return jsonify({"error": "Internship not found"}), 404
 
-    internship["_id"] = str(internship["_id"])
-    internship["userId"] = str(internship["userId"])
+    return conditional(etag_for([internship]), lambda: jsonify(internship))
 
-    return jsonify(internship), 200
 
+@internships_bp.route("/<internship_id>/full", methods=["GET"])
+@jwt_required()
+def get_full_internship(internship_id):
+    """
+    Internship + weeks + tasks in one response (replaces fetching
+    /weeks and /tasks?week=N per week). `fields=*` includes task
+    descriptions.
+    """
+
+    iid = to_object_id(internship_id)
+    if not iid:
+        return jsonify({"error": "Invalid internship id"}), 400
+
+    user_id = ObjectId(get_jwt_identity())
+    include_text = request.args.get("fields") == "*"
+
+    result = list(internships_col.aggregate(
+        full_internship_pipeline(iid, user_id, include_text)
+    ))
+
+    if not result:
+        return jsonify({"error": "Internship not found"}), 404
+
+    internship = result[0]
+    docs = [internship]
+    for week in internship["weeks"]:
+        docs.append(week)
+        docs.extend(week["tasks"])
+
+    return conditional(etag_for(docs), lambda: jsonify(internship))
 
 
 @internships_bp.route("/<internship_id>/weeks", methods=["GET"])
@@ -96,13 +250,23 @@ def get_weeks(internship_id):
     if not iid:
         return jsonify({"error": "Invalid internship id"}), 400
 
-    weeks = []
-    for w in weekly_plans_col.find({"internshipId": iid}).sort("weekNumber", 1):
-        w["_id"] = str(w["_id"])
-        w["internshipId"] = str(w["internshipId"])
-        weeks.append(w)
+    if not owns_internship(iid, get_jwt_identity()):
+        return jsonify({"error": "Internship not found"}), 404
 
-    return jsonify(weeks), 200
+    # weekNumber is unique per internship: it doubles as the cursor
+    try:
+        weeks, next_cursor = paginate(
+            weekly_plans_col,
+            {"internshipId": iid},
+            sort_field="weekNumber"
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return conditional(
+        etag_for(weeks),
+        lambda: page_response(weeks, next_cursor)
+    )
 
 
 @internships_bp.route("/<internship_id>/tasks", methods=["GET"])
@@ -112,26 +276,39 @@ def get_tasks(internship_id):
     if not iid:
         return jsonify({"error": "Invalid internship id"}), 400
 
+    if not owns_internship(iid, get_jwt_identity()):
+        return jsonify({"error": "Internship not found"}), 404
+
     week_number = request.args.get("week")
     query = {"internshipId": iid}
 
     if week_number:
+        try:
+            week_number = int(week_number)
+        except ValueError:
+            return jsonify({"error": "week must be an integer"}), 400
+
         week_doc = weekly_plans_col.find_one({
             "internshipId": iid,
-            "weekNumber": int(week_number)
+            "weekNumber": week_number
         })
         if not week_doc:
             return jsonify([]), 200
         query["weekId"] = week_doc["_id"]
 
-    tasks = []
-    for t in tasks_col.find(query):
-        t["_id"] = str(t["_id"])
-        t["internshipId"] = str(t["internshipId"])
-        t["weekId"] = str(t["weekId"])
-        tasks.append(t)
-
-    return jsonify(tasks), 200
+    try:
+        tasks, next_cursor = paginate(
+            tasks_col,
+            query,
+            summary_exclude=TASK_SUMMARY_EXCLUDE
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return conditional(
+        etag_for(tasks),
+        lambda: page_response(tasks, next_cursor)
+    )
 
 @internships_bp.route("/<internship_id>/tasks/<task_id>", methods=["GET"])
 @jwt_required()
@@ -145,11 +322,7 @@ def get_single_task(internship_id, task_id):
         return jsonify({"error": "Invalid internshipId or taskId"}), 400
 
     # Ensure internship belongs to user
-    internship = internships_col.find_one({
-        "_id": iid,
-        "userId": user_id
-    })
-    if not internship:
+    if not owns_internship(iid, user_id):
         return jsonify({"error": "Internship not found"}), 404
 
     task = tasks_col.find_one({
@@ -160,9 +333,4 @@ def get_single_task(internship_id, task_id):
     if not task:
         return jsonify({"error": "Task not found"}), 404
 
-    # Serialize ObjectIds
-    task["_id"] = str(task["_id"])
-    task["internshipId"] = str(task["internshipId"])
-    task["weekId"] = str(task["weekId"])
-
-    return jsonify(task), 200
+    return conditional(etag_for([task]), lambda: jsonify(task), IMMUTABLE)
@@ -0,0 +1,306 @@
+from bson import ObjectId
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure, PyMongoError
+import asyncio
+import os
+import socket
+import threading
+import time
+import traceback
+import httpx
+
+from app import async_db
+from app.ai.resilience import CircuitOpen, LLMError
+from app.db import jobs_col
+from app.runtime import runtime
+
+load_dotenv()
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))
+# A running job whose heartbeat is older than this is considered orphaned
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "90"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+
+# Failures another attempt can fix: the provider or the database being
+# briefly unreachable. LLMErrors say for themselves (LLMError.retryable).
+TRANSIENT_ERRORS = (httpx.TransportError, ConnectionFailure, asyncio.TimeoutError)
+
+# job type -> {"handler", "concurrency", "on_failure"}
+_handlers = {}
+
+
+def register(job_type, concurrency=None, on_failure=None):
+    """
+    Decorator registering an async handler for a job type.
+
+    handler(job) -> dict result stored on the job document
+    on_failure(job, error) is awaited once the job has failed for good
+    (retries exhausted, or an error that is not transient)
+    """
+
+    def decorator(handler):
+        _handlers[job_type] = {
+            "handler": handler,
+            "concurrency": concurrency or JOB_CONCURRENCY,
+            "on_failure": on_failure
+        }
+        return handler
+
+    return decorator
+
+
+def enqueue(job_type, user_id, payload, options=None) -> ObjectId:
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    now = datetime.utcnow()
+    job_id = jobs_col.insert_one({
+        "type": job_type,
+        "userId": ObjectId(user_id),
+        "payload": payload,
+        "options": options or {},
+        "status": "queued",
+        "attempts": 0,
+        "runAt": now,
+        "createdAt": now,
+        "updatedAt": now
+    }).inserted_id
+
+    worker.ensure_started()
+    worker.wake()
+
+    return job_id
+
+
+def is_transient(error) -> bool:
+    """
+    Whether a failed job is worth retrying. Anything else (schema
+    violations, bad input, bugs) would fail the same way again, after
+    repeating every LLM call, so it fails the job at once.
+    """
+
+    # Wrapped errors (raise ... from e) are judged by their cause
+    while error is not None:
+        if isinstance(error, LLMError):
+            return error.retryable or isinstance(error, CircuitOpen)
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        error = error.__cause__
+    return False
+
+
+async def get_job(job_id, user_id):
+    return await async_db.jobs_col.find_one({
+        "_id": job_id,
+        "userId": ObjectId(user_id)
+    })
+
+
+class JobWorker:
+    """
+    Per-process job runner living on the runtime loop.
+
+    Jobs are claimed atomically (find_one_and_update), so every gunicorn
+    worker can run one of these against the shared `jobs` collection.
+    Running jobs heartbeat; jobs whose owner died are requeued.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._wake = None
+        self._running = {}  # job type -> number of in-flight jobs
+        self._lock = threading.Lock()
+        self.worker_id = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._running = {}
+            self.worker_id = f"{socket.gethostname()}:{self._pid}"
+            runtime.spawn(self._main())
+
+    def wake(self):
+        if self._wake is not None:
+            runtime.get_loop().call_soon_threadsafe(self._wake.set)
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        last_recovery = 0
+
+        while True:
+            try:
+                if time.monotonic() - last_recovery > JOB_STALE_SECONDS / 3:
+                    last_recovery = time.monotonic()
+                    for job in await recover_stale_jobs():
+                        await self._on_failure(job, job["error"])
+
+                await self._dispatch()
+            except Exception:
+                traceback.print_exc()
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _dispatch(self):
+        for job_type, spec in _handlers.items():
+            while self._running.get(job_type, 0) < spec["concurrency"]:
+                job = await self._claim(job_type)
+                if not job:
+                    break
+
+                self._running[job_type] = self._running.get(job_type, 0) + 1
+                runtime.spawn(self._execute(job, spec))
+
+    async def _claim(self, job_type):
+        now = datetime.utcnow()
+        return await async_db.jobs_col.find_one_and_update(
+            {
+                "type": job_type,
+                "status": "queued",
+                "runAt": {"$lte": now}
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "lockedBy": self.worker_id,
+                    "startedAt": now,
+                    "heartbeatAt": now,
+                    "updatedAt": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("runAt", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                await async_db.jobs_col.update_one(
+                    {"_id": job_id, "lockedBy": self.worker_id},
+                    {"$set": {"heartbeatAt": datetime.utcnow()}}
+                )
+            except PyMongoError as e:
+                # A missed beat is not fatal; the next one may get through
+                # well before the job counts as stale
+                print(f"Job {job_id} heartbeat failed: {e}")
+
+    async def _execute(self, job, spec):
+        heartbeat = asyncio.create_task(self._heartbeat(job["_id"]))
+
+        try:
+            result = await spec["handler"](job)
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            now = datetime.utcnow()
+            await async_db.jobs_col.update_one(
+                {"_id": job["_id"]},
+                {
+                    "$set": {
+                        "status": "done",
+                        "result": result,
+                        "finishedAt": now,
+                        "updatedAt": now
+                    },
+                    "$unset": {"lockedBy": "", "error": ""}
+                }
+            )
+        finally:
+            heartbeat.cancel()
+            self._running[job["type"]] -= 1
+            self.wake()
+
+    async def _fail(self, job, error):
+        now = datetime.utcnow()
+        final = job["attempts"] >= JOB_MAX_ATTEMPTS or not is_transient(error)
+
+        update = {
+            "status": "failed" if final else "queued",
+            "error": str(error),
+            "updatedAt": now
+        }
+        if final:
+            update["finishedAt"] = now
+        else:
+            update["runAt"] = now + timedelta(
+                seconds=JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1)
+            )
+
+        await async_db.jobs_col.update_one(
+            {"_id": job["_id"]},
+            {"$set": update, "$unset": {"lockedBy": ""}}
+        )
+
+        if final:
+            await self._on_failure(job, error)
+
+    async def _on_failure(self, job, error):
+        spec = _handlers.get(job["type"])
+        if not spec or not spec["on_failure"]:
+            return
+
+        try:
+            await spec["on_failure"](job, error)
+        except Exception:
+            traceback.print_exc()
+
+
+async def recover_stale_jobs():
+    """
+    Requeues running jobs whose worker stopped heartbeating (crash, OOM,
+    redeploy). Jobs that already used all attempts are marked failed and
+    returned so their failure hooks can run.
+    """
+
+    now = datetime.utcnow()
+    stale = {
+        "status": "running",
+        "heartbeatAt": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}
+    }
+
+    exhausted = []
+    async for job in async_db.jobs_col.find({**stale, "attempts": {"$gte": JOB_MAX_ATTEMPTS}}):
+        job = await async_db.jobs_col.find_one_and_update(
+            {"_id": job["_id"], **stale},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": "Worker lost while running job",
+                    "finishedAt": now,
+                    "updatedAt": now
+                },
+                "$unset": {"lockedBy": ""}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            exhausted.append(job)
+
+    await async_db.jobs_col.update_many(
+        {**stale, "attempts": {"$lt": JOB_MAX_ATTEMPTS}},
+        {
+            "$set": {"status": "queued", "runAt": now, "updatedAt": now},
+            "$unset": {"lockedBy": ""}
+        }
+    )
+
+    return exhausted
+
+
+worker = JobWorker()
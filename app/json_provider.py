@@ -0,0 +1,78 @@
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from bson import Binary, Decimal128, ObjectId, Timestamp
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+import base64
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def bson_default(o):
+    """
+    Serializes BSON/driver types that plain JSON encoders reject.
+    """
+
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, Timestamp):
+        return o.as_datetime().isoformat()
+    if isinstance(o, (Binary, bytes)):
+        return base64.b64encode(bytes(o)).decode("ascii")
+    if isinstance(o, UUID):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _stdlib_default(o):
+    # Same wire format as the orjson path: ISO 8601, naive values are UTC
+    if isinstance(o, datetime):
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return o.isoformat()
+    if isinstance(o, date):
+        return o.isoformat()
+    return bson_default(o)
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    Stdlib fallback used when orjson is not installed.
+    """
+
+    default = staticmethod(_stdlib_default)
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    orjson-backed provider: ObjectId/BSON types via bson_default,
+    datetimes natively as ISO 8601 (naive values treated as UTC).
+    """
+
+    OPTIONS = (orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=bson_default, option=self.OPTIONS).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=bson_default, option=self.OPTIONS),
+            mimetype="application/json"
+        )
+
+
+def json_provider_class():
+    return OrjsonProvider if orjson else BSONJSONProvider
@@ -0,0 +1,50 @@
+from dotenv import load_dotenv
+from flask import Blueprint, jsonify, request
+import hmac
+import os
+
+load_dotenv()
+
+metrics_bp = Blueprint("metrics", __name__)
+
+# Bearer token for GET /metrics; without one only loopback clients are served
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LOOPBACK = {"127.0.0.1", "::1"}
+
+# name -> zero-arg callable returning a JSON-serializable dict
+_sources = {}
+
+
+def register(name: str, source):
+    """
+    Exposes `source()` under `name` at GET /metrics.
+    """
+
+    _sources[name] = source
+    return source
+
+
+def snapshot() -> dict:
+    return {name: source() for name, source in _sources.items()}
+
+
+def _authorized() -> bool:
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+    # Behind a proxy every client looks local: set METRICS_TOKEN there
+    return request.remote_addr in LOOPBACK
+
+
+@metrics_bp.route("", methods=["GET"])
+def get_metrics():
+    """
+    Internal counters (caches, queues, sandbox, batching). Not for
+    clients: guarded by METRICS_TOKEN, or loopback-only without it.
+    """
+
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+
+    return jsonify(snapshot()), 200
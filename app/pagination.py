@@ -0,0 +1,110 @@
+from flask import request, jsonify
+from bson import ObjectId
+from dotenv import load_dotenv
+import os
+import re
+
+from app.conditional import VERSION_FIELDS
+
+load_dotenv()
+
+DEFAULT_PAGE_LIMIT = int(os.getenv("DEFAULT_PAGE_LIMIT", "100"))
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", "500"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Plain (dotted) field paths only: no $-operators or positional projections
+FIELD_NAME = re.compile(r"^[A-Za-z_]\w*(\.\w+)*$")
+
+
+class PageError(ValueError):
+    pass
+
+
+def _parse_limit():
+    raw = request.args.get("limit")
+    if raw is None:
+        return DEFAULT_PAGE_LIMIT
+
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PageError("limit must be an integer")
+
+    if limit < 1:
+        raise PageError("limit must be positive")
+
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+def _parse_after(sort_field):
+    raw = request.args.get("after")
+    if not raw:
+        return None
+
+    try:
+        return ObjectId(raw) if sort_field == "_id" else int(raw)
+    except Exception:
+        raise PageError("Invalid after cursor")
+
+
+def _projection(sort_field, summary_exclude):
+    """
+    `fields=a,b` -> only those fields (plus _id, the cursor field and
+                    the fields the ETag is derived from)
+    `fields=*`   -> full documents
+    no `fields`  -> summary view: everything but `summary_exclude`
+    """
+
+    raw = request.args.get("fields")
+
+    if raw is None:
+        return {f: 0 for f in summary_exclude} or None
+
+    if raw.strip() == "*":
+        return None
+
+    fields = {f.strip() for f in raw.split(",") if f.strip()}
+    for field in fields:
+        if not FIELD_NAME.match(field):
+            raise PageError(f"Invalid field name: {field}")
+    fields.add(sort_field)
+    # Otherwise a status change would not change the ETag: stale 304s
+    fields.update(VERSION_FIELDS)
+    return {"_id": 1, **{f: 1 for f in fields}}
+
+
+def paginate(col, query, sort_field="_id", summary_exclude=()):
+    """
+    Keyset pagination over `sort_field` (unique within `query`).
+    Reads `limit`, `after` and `fields` from the request.
+
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    Raises PageError on malformed parameters.
+    """
+
+    limit = _parse_limit()
+    after = _parse_after(sort_field)
+
+    if after is not None:
+        query = {**query, sort_field: {"$gt": after}}
+
+    cursor = (
+        col.find(query, _projection(sort_field, summary_exclude))
+        .sort(sort_field, 1)
+        .limit(limit + 1)
+    )
+
+    docs = list(cursor)
+    if len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    return docs, str(docs[-1][sort_field])
+
+
+def page_response(docs, next_cursor):
+    response = jsonify(docs)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response, 200
@@ -0,0 +1,147 @@
+from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import asyncio
+import multiprocessing
+import os
+import threading
+import weakref
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app import metrics
+from app.runtime import runtime
+
+load_dotenv()
+
+# werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes made with other parameters are upgraded on the next login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+# Hashing processes per worker; 0 hashes on a thread instead (hashlib
+# releases the GIL, but the work still competes with the worker's CPU)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash/verify operations queued or running at once; beyond that callers wait
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(4 * max(1, PASSWORD_HASH_WORKERS))))
+# Longest wait for a slot before failing with PasswordServiceBusy
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+stats = {
+    "hashes": 0,
+    "verifies": 0,
+    "rehashes": 0,
+    "busy": 0
+}
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Too many hash operations pending: the caller should answer 503."""
+
+
+@lru_cache(maxsize=None)
+def method_prefix(method: str) -> str:
+    """
+    The method as werkzeug writes it into hashes, defaults filled in
+    ("scrypt" -> "scrypt:32768:8:1"). Costs one hash, once per method.
+    """
+
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+class PasswordHasher:
+    """
+    Runs hashing off the event loop: in a process pool owned by this
+    worker process (rebuilt after fork), bounded to
+    PASSWORD_HASH_MAX_PENDING operations in flight.
+    """
+
+    def __init__(self, workers, max_pending, queue_timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._prefix = None
+        # asyncio primitives are bound to one loop
+        self._slots = weakref.WeakKeyDictionary()
+
+    def _executor(self):
+        if not self.workers:
+            return None
+
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    # spawn: forking a threaded worker can deadlock the child
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                    self._pid = os.getpid()
+
+        return self._pool
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            stats["busy"] += 1
+            raise PasswordServiceBusy("Password hashing is saturated, try again shortly")
+
+        try:
+            return await loop.run_in_executor(self._executor(), fn, *args)
+        finally:
+            slots.release()
+
+    async def hash(self, password: str) -> str:
+        stats["hashes"] += 1
+        return await self._call(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        stats["verifies"] += 1
+        return await self._call(check_password_hash, password_hash, password)
+
+    async def needs_rehash(self, password_hash: str) -> bool:
+        if self._prefix is None:
+            self._prefix = await self._call(method_prefix, PASSWORD_HASH_METHOD)
+        return password_hash.split("$", 1)[0] != self._prefix
+
+    async def upgrade(self, users_col, user_id, old_hash: str, password: str):
+        """
+        Re-hashes a verified password with the current method. Guarded
+        on the old hash so a concurrent password change wins.
+        """
+
+        new_hash = await self.hash(password)
+        await users_col.update_one(
+            {"_id": user_id, "passwordHash": old_hash},
+            {"$set": {"passwordHash": new_hash}}
+        )
+        stats["rehashes"] += 1
+
+    async def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        return {
+            **stats,
+            "method": PASSWORD_HASH_METHOD,
+            "workers": self.workers,
+            "maxPending": self.max_pending
+        }
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_QUEUE_TIMEOUT
+)
+
+runtime.on_shutdown(password_hasher.close)
+metrics.register("passwordHashing", password_hasher.snapshot)
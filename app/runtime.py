@@ -0,0 +1,180 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import os
+import threading
+
+
+class Runtime:
+    """
+    One long-lived event loop per worker process.
+
+    Sync Flask views hand coroutines to this loop instead of building
+    a throwaway loop per request, so pooled resources bound to the loop
+    (HTTP clients, DB clients) survive across requests.
+
+    Under WSGI the loop runs in a daemon thread and is recreated after
+    fork. Under ASGI the server's own loop is attached instead.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks = []
+        self._tasks = set()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._start()
+
+        return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=_run, name="app-runtime", daemon=True)
+        thread.start()
+        ready.wait()
+
+        self._loop = loop
+        self._thread = thread
+        self._pid = os.getpid()
+        self._tasks = set()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Adopts an externally owned loop (the ASGI server's) as the runtime
+        loop. The owner is responsible for awaiting aclose().
+        """
+
+        with self._lock:
+            self._loop = loop
+            self._thread = None
+            self._pid = os.getpid()
+            self._tasks = set()
+
+    def on_shutdown(self, hook):
+        """
+        Registers an async callable run on the loop during shutdown.
+        """
+
+        self._shutdown_hooks.append(hook)
+        return hook
+
+    def submit(self, coro, context=None):
+        """
+        Schedules a coroutine on the runtime loop.
+        Returns a concurrent.futures.Future.
+
+        By default the caller's contextvars (Flask request/app context)
+        are carried over to the task.
+        """
+
+        loop = self.get_loop()
+        if context is None:
+            context = contextvars.copy_context()
+        future = concurrent.futures.Future()
+
+        def _done(task):
+            if task.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def _start():
+            if not future.set_running_or_notify_cancel():
+                coro.close()
+                return
+            loop.create_task(coro, context=context).add_done_callback(_done)
+
+        loop.call_soon_threadsafe(_start)
+        return future
+
+    def run(self, coro, timeout=None):
+        """
+        Runs a coroutine on the runtime loop and blocks until it finishes.
+        Must not be called from the loop's own thread.
+        """
+
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """
+        Drives an async generator on the runtime loop from a sync caller
+        (e.g. a streaming Flask response), one item at a time.
+        """
+
+        try:
+            while True:
+                try:
+                    item = self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            self.run(agen.aclose())
+
+    def spawn(self, coro):
+        """
+        Starts a background task on the runtime loop, detached from the
+        caller's context. Spawned tasks are cancelled at shutdown.
+        """
+
+        async def _tracked():
+            task = asyncio.current_task()
+            self._tasks.add(task)
+            try:
+                return await coro
+            finally:
+                self._tasks.discard(task)
+
+        return self.submit(_tracked(), context=contextvars.Context())
+
+    async def aclose(self):
+        """
+        Cancels spawned tasks and runs the shutdown hooks.
+        Must be awaited on the runtime loop.
+        """
+
+        pending = list(self._tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        for hook in reversed(self._shutdown_hooks):
+            try:
+                await hook()
+            except Exception:
+                pass
+
+    def shutdown(self, timeout=10):
+        # Attached loops are closed by their owner (ASGI lifespan)
+        if self._thread is None or self._pid != os.getpid():
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._loop = None
+            self._thread = None
+
+
+runtime = Runtime()
+atexit.register(runtime.shutdown)
@@ -0,0 +1,376 @@
+from dotenv import load_dotenv
+import asyncio
+import builtins
+import json
+import keyword
+import os
+import pwd
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import weakref
+
+from app import metrics
+from app.runtime import runtime
+
+load_dotenv()
+
+SANDBOX_ENABLED = os.getenv("SANDBOX_ENABLED", "1") == "1"
+# Idle sandboxes kept started per worker, and runs in flight at once
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", "2"))
+SANDBOX_MAX_RUNNING = int(os.getenv("SANDBOX_MAX_RUNNING", str(max(1, SANDBOX_POOL_SIZE))))
+# Wall clock per run; CPU time and memory are capped separately by rlimits
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "10"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "5"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+SANDBOX_FILE_MB = int(os.getenv("SANDBOX_FILE_MB", "1"))
+SANDBOX_OUTPUT_CHARS = int(os.getenv("SANDBOX_OUTPUT_CHARS", "2000"))
+# Unprivileged account to run submissions as (needs a root server, and
+# the interpreter and app/sandbox_runner.py readable by it). Also makes
+# the runner's RLIMIT_NPROC effective; empty keeps the server's user
+SANDBOX_USER = os.getenv("SANDBOX_USER", "")
+# Without SANDBOX_USER, submitted code could write wherever the server
+# can (sqlite files included): no grading unless this is turned off,
+# which is only meant for local development
+SANDBOX_REQUIRE_ISOLATION = os.getenv("SANDBOX_REQUIRE_ISOLATION", "1") == "1"
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_runner.py")
+
+LIMITS = json.dumps({
+    "cpuSeconds": SANDBOX_CPU_SECONDS,
+    "memoryMb": SANDBOX_MEMORY_MB,
+    "fileMb": SANDBOX_FILE_MB,
+    "outputChars": SANDBOX_OUTPUT_CHARS
+})
+
+# Looks like Python (broken Python included), and not like another language.
+# FOREIGN_HINTS only matters for code that does not compile
+PYTHON_HINTS = re.compile(r"^\s*(def\s+\w+\s*\(|class\s+\w+.*:|import\s+\w+|from\s+[\w.]+\s+import\b|print\()", re.M)
+FOREIGN_HINTS = re.compile(
+    r";\s*$|\)\s*\{\s*$|^\s*#include\b|^\s*end\s*$|\bfunction\s+\w+\s*\(|\b(const|let)\s+\w+\s*=",
+    re.M
+)
+
+# Markdown answers: the Python (or untagged) fenced blocks are the code
+FENCED_BLOCK = re.compile(r"^```[ \t]*(\w*)[^\n]*\n(.*?)^```", re.M | re.S)
+FENCE_LANGUAGES = ("", "py", "python", "python3")
+# A line that reads as code, for trimming prose around unfenced code:
+# indented, a comment or decorator, a statement keyword, an assignment or call
+STATEMENT_KEYWORDS = [k for k in keyword.kwlist if k.islower() and k not in ("and", "as", "in", "is", "not", "or")]
+CODE_LINE = re.compile(
+    r"^(\s+\S|\s*[#@]|\s*(" + "|".join(STATEMENT_KEYWORDS) + r")\b"
+    r"|\s*[A-Za-z_][\w.\[\]'\"]*\s*([-+*/%|&^]?=|\())"
+)
+# A sentence: capitalised word, more words, closing punctuation
+PROSE_LINE = re.compile(r"^\s*[A-Z][a-z]*(\s+[\w'(),-]+){2,}[.:!?]?\s*$")
+
+# Names a task asks for: "name()", "function named name", "class called Name";
+# not method calls such as ".split()"
+NAME_MENTIONS = [
+    re.compile(r"(?<![.\w])([A-Za-z_]\w*)\(\)"),
+    re.compile(r"\b(?:function|class)\s+(?:named|called)\s+`?([A-Za-z_]\w*)")
+]
+NOT_DEFINITIONS = set(dir(builtins))
+
+
+def detect_language(task_description: str, code: str):
+    """
+    "python", or None for anything the sandbox cannot run (other
+    languages, prose answers, repository links).
+    """
+
+    if not PYTHON_HINTS.search(code):
+        return None
+
+    try:
+        compile(code, "submission.py", "exec", dont_inherit=True)
+        return "python"
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        pass
+
+    # A Python task settles it; otherwise rule out look-alike languages
+    if "python" in task_description.lower() or not FOREIGN_HINTS.search(code):
+        return "python"
+    return None
+
+
+def derive_checks(task_description: str) -> list:
+    """
+    Top-level names the task description asks the code to define.
+    """
+
+    names = []
+    for pattern in NAME_MENTIONS:
+        for name in pattern.findall(task_description):
+            dunder = name.startswith("__") and name.endswith("__")
+            if not dunder and name not in NOT_DEFINITIONS and name not in names:
+                names.append(name)
+    return names
+
+
+def extract_code(text: str) -> str:
+    """
+    The code of a submission: its Python fenced blocks when it is a
+    Markdown answer, otherwise the text, without leading and trailing
+    lines of prose when it does not compile as it is.
+    """
+
+    blocks = [body for lang, body in FENCED_BLOCK.findall(text) if lang.lower() in FENCE_LANGUAGES]
+    if blocks:
+        return "\n".join(blocks)
+
+    try:
+        compile(text, "submission.py", "exec", dont_inherit=True)
+        return text
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        pass
+
+    lines = text.splitlines()
+    code = [i for i, line in enumerate(lines) if CODE_LINE.match(line)]
+    if not code:
+        return text
+    return "\n".join(lines[code[0]:code[-1] + 1])
+
+
+def _reads_as_prose(code: str, line) -> bool:
+    lines = code.splitlines()
+    return bool(line) and 0 < line <= len(lines) and bool(PROSE_LINE.match(lines[line - 1]))
+
+
+class _Sandbox:
+    def __init__(self, process, workdir):
+        self.process = process
+        self.workdir = workdir
+
+    async def discard(self):
+        if self.process.returncode is None:
+            # The runner and the child running the submission
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    Pre-started runner processes (app/sandbox_runner.py), one per run.
+
+    Each sandbox has the interpreter already started and its rlimits
+    applied, and waits on stdin; a run hands it the job, collects the
+    result and throws the process away, so nothing survives between
+    submissions. Used sandboxes are replaced in the background.
+
+    Runners get an empty environment, a throwaway working directory, a
+    process group of their own, SANDBOX_USER's uid when set and, where
+    `unshare` allows it, a network namespace with no interfaces.
+    """
+
+    def __init__(self, size, max_running, timeout):
+        self.size = size
+        self.max_running = max_running
+        self.timeout = timeout
+        self._isolate_network = None
+        self._isolation = False     # not probed yet
+        # asyncio processes and primitives are bound to one loop
+        self._state = weakref.WeakKeyDictionary()
+        self.stats = {
+            "runs": 0,
+            "timeouts": 0,
+            "crashes": 0,
+            "failures": 0,
+            "refused": 0,
+            "started": 0,
+            "prewarmedHits": 0
+        }
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._state.get(loop)
+        if state is None:
+            state = self._state[loop] = {
+                "idle": [],
+                "starting": 0,
+                "slots": asyncio.Semaphore(self.max_running)
+            }
+        return state
+
+    @property
+    def isolation(self):
+        """
+        "user" when runs switch to an unprivileged account other than the
+        server's, else None.
+        """
+
+        if self._isolation is False:
+            self._isolation = None
+            if SANDBOX_USER:
+                try:
+                    uid = pwd.getpwnam(SANDBOX_USER).pw_uid
+                except KeyError:
+                    print(f"Sandbox: unknown SANDBOX_USER {SANDBOX_USER!r}")
+                else:
+                    if uid not in (0, os.getuid()):
+                        self._isolation = "user"
+            if self._isolation is None and SANDBOX_REQUIRE_ISOLATION:
+                print("Sandbox: no unprivileged SANDBOX_USER, grading is off")
+        return self._isolation
+
+    def allowed(self) -> bool:
+        return self.isolation is not None or not SANDBOX_REQUIRE_ISOLATION
+
+    def _command(self):
+        command = [sys.executable, "-I", RUNNER, LIMITS]
+
+        if self._isolate_network is None:
+            # Unprivileged network namespaces are not available everywhere
+            probe = shutil.which("unshare")
+            self._isolate_network = bool(probe) and subprocess.run(
+                [probe, "--net", "--map-root-user", "true"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            ).returncode == 0
+            if not self._isolate_network:
+                print("Sandbox: network namespaces unavailable, relying on the runner's socket block")
+
+        if self._isolate_network:
+            command = ["unshare", "--net", "--map-root-user"] + command
+        return command
+
+    async def _start(self) -> _Sandbox:
+        workdir = tempfile.mkdtemp(prefix="sandbox-")
+        user = {}
+        if SANDBOX_USER:
+            account = pwd.getpwnam(SANDBOX_USER)
+            os.chown(workdir, account.pw_uid, account.pw_gid)
+            user = {"user": account.pw_uid, "group": account.pw_gid, "extra_groups": []}
+
+        process = await asyncio.create_subprocess_exec(
+            *self._command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=workdir,
+            env={"PATH": os.defpath, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONHASHSEED": "0"},
+            start_new_session=True,
+            **user
+        )
+        self.stats["started"] += 1
+        return _Sandbox(process, workdir)
+
+    async def _refill(self):
+        state = self._loop_state()
+
+        while len(state["idle"]) + state["starting"] < self.size:
+            state["starting"] += 1
+            try:
+                state["idle"].append(await self._start())
+            except OSError as e:
+                print(f"Sandbox start failed: {e}")
+                return
+            finally:
+                state["starting"] -= 1
+
+    async def _acquire(self) -> _Sandbox:
+        state = self._loop_state()
+
+        sandbox = None
+        while state["idle"]:
+            candidate = state["idle"].pop()
+            if candidate.process.returncode is None:
+                sandbox = candidate
+                self.stats["prewarmedHits"] += 1
+                break
+            await candidate.discard()
+
+        runtime.spawn(self._refill())
+        return sandbox or await self._start()
+
+    async def run(self, code: str, names: list) -> dict:
+        """
+        Compiles and runs `code`, then checks that `names` are defined.
+        Returns the runner's result: status is one of passed,
+        syntax_error, runtime_error, needs_input, timeout, crashed. Name
+        checks are reported separately and never change the status.
+        """
+
+        async with self._loop_state()["slots"]:
+            sandbox = await self._acquire()
+            self.stats["runs"] += 1
+
+            job = json.dumps({"code": code, "names": names}).encode() + b"\n"
+
+            try:
+                out, _ = await asyncio.wait_for(sandbox.process.communicate(job), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                return {"status": "timeout", "error": f"Did not finish within {self.timeout:g}s", "checks": []}
+            finally:
+                await sandbox.discard()
+
+        try:
+            result = json.loads(out)
+        except ValueError:
+            self.stats["crashes"] += 1
+            return {"status": "crashed", "error": f"Sandbox exited with {sandbox.process.returncode}", "checks": []}
+
+        # The runner reports the child's CPU limit and crashes itself
+        if result["status"] == "timeout":
+            self.stats["timeouts"] += 1
+        elif result["status"] == "crashed":
+            self.stats["crashes"] += 1
+        return result
+
+    async def close(self):
+        state = self._state.pop(asyncio.get_running_loop(), None)
+        for sandbox in (state or {}).get("idle", []):
+            await sandbox.discard()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "enabled": SANDBOX_ENABLED,
+            "grading": SANDBOX_ENABLED and self.allowed(),
+            "isolation": self.isolation,
+            "networkIsolated": self._isolate_network
+        }
+
+
+sandbox_pool = SandboxPool(SANDBOX_POOL_SIZE, SANDBOX_MAX_RUNNING, SANDBOX_TIMEOUT)
+
+runtime.on_shutdown(sandbox_pool.close)
+metrics.register("sandbox", sandbox_pool.snapshot)
+
+
+async def grade(task_description: str, code: str):
+    """
+    Sandbox result for a submission, or None when grading is disabled or
+    not isolated, or the language is not supported (the LLM then judges alone). Status
+    "not_run" is a syntax error that may come from prose around the code.
+    """
+
+    if not SANDBOX_ENABLED:
+        return None
+    # Fail closed: no run without an account of its own
+    if not sandbox_pool.allowed():
+        sandbox_pool.stats["refused"] += 1
+        return None
+
+    source = extract_code(code)
+    if detect_language(task_description, source) != "python":
+        return None
+
+    result = await sandbox_pool.run(source, derive_checks(task_description))
+    result["language"] = "python"
+
+    # Only a real syntax error settles the feedback without the model;
+    # a failure on stripped text or on a line of prose may be ours
+    if result["status"] == "syntax_error" and (
+        source.strip() != code.strip() or _reads_as_prose(source, result.get("line"))
+    ):
+        result["status"] = "not_run"
+    return result
@@ -0,0 +1,316 @@
+"""
+Sandbox process for app/sandbox.py. Standalone on purpose (stdlib
+only, run with `python -I`): it never imports the app, so nothing of
+the server's state or configuration is reachable from submitted code.
+
+Lifecycle: started ahead of time (in a fresh working directory, with
+its limits as argv), it blocks on stdin for exactly one job, then forks
+a child that applies the limits and runs the code. Only this process,
+which never runs submitted code, writes the result the server reads
+(fd 1); the child reports over a pipe and its report is checked here.
+
+The audit hook is a second line of defence behind the rlimits, the
+wall-clock timeout and the namespaces set up by the pool.
+"""
+
+import builtins
+import contextlib
+import io
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+
+# Audit events submitted code may raise; everything else (processes,
+# sockets, sqlite3, ctypes, code objects, ...) is denied. Events carrying
+# paths are checked separately below
+ALLOWED_EVENTS = frozenset((
+    "builtins.id",
+    "builtins.input",
+    "builtins.input/result",
+    "compile",
+    "exec",
+    "function.__new__",
+    "glob.glob",
+    "glob.glob/2",
+    "marshal.dumps",
+    "marshal.loads",
+    "object.__delattr__",
+    "object.__getattr__",
+    "object.__setattr__",
+    "pickle.find_class",
+    "shutil.copyfile",
+    "shutil.copymode",
+    "shutil.copystat",
+    "shutil.copytree",
+    "shutil.move",
+    "shutil.rmtree",
+    "sys._getframe",
+    "sys.excepthook",
+    "sys.set_asyncgen_hook_finalizer",
+    "sys.set_asyncgen_hook_firstiter",
+    "tempfile.mkdtemp",
+    "tempfile.mkstemp",
+    "time.sleep",
+))
+# Modules doing file or process I/O in C without audit events
+DENIED_IMPORTS = ("_posixsubprocess", "_sqlite3", "_dbm", "_gdbm")
+
+# Events changing files: their path arguments must be in the working directory
+WRITE_EVENTS = {
+    "os.remove": (0,),
+    "os.rmdir": (0,),
+    "os.mkdir": (0,),
+    "os.rename": (0, 1),
+    "os.link": (0, 1),
+    "os.symlink": (1,),
+    "os.truncate": (0,),
+    "os.chmod": (0,),
+    "os.chown": (0,),
+    "os.utime": (0,),
+}
+LIST_EVENTS = ("os.listdir", "os.scandir")
+
+# os.open() reports flags only
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+# What a run can report; "timeout" and "crashed" are decided here or by the pool
+STATUSES = ("passed", "syntax_error", "runtime_error", "needs_input")
+
+# The pool starts the runner there; chdir is not allowed, so it stays put
+WORKDIR = os.path.realpath(os.getcwd()) + os.sep
+
+
+def apply_limits(limits):
+    mb = 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_CPU, (limits["cpuSeconds"], limits["cpuSeconds"] + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (limits["memoryMb"] * mb, limits["memoryMb"] * mb))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limits["fileMb"] * mb, limits["fileMb"] * mb))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    # No processes or threads (not enforced for a real root user)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+# Readable besides the working directory: the interpreter's own files
+READABLE = tuple({
+    os.path.realpath(prefix) + os.sep
+    for prefix in (sys.prefix, sys.base_prefix, sys.exec_prefix)
+}) + ("/dev/null", "/dev/urandom")
+
+
+def _inside(path, prefixes=()) -> bool:
+    # Descriptors only come from opens that were checked
+    if path is None or isinstance(path, int):
+        return True
+
+    path = os.path.realpath(os.fsdecode(path))
+    return (path + os.sep).startswith(WORKDIR) or path.startswith(prefixes)
+
+
+def _allowed_open(path, mode, flags):
+    if _inside(path):
+        return True
+    # Never the server's files, /proc/<pid>/environ and the like
+    writing = (mode is not None and any(flag in mode for flag in "wax+")) or bool((flags or 0) & WRITE_FLAGS)
+    return not writing and _inside(path, READABLE)
+
+
+def deny(event, args):
+    if event == "import":
+        if args[0] in DENIED_IMPORTS:
+            raise PermissionError(f"import {args[0]} is not allowed in the sandbox")
+    elif event == "open":
+        if not _allowed_open(*args[:3]):
+            raise PermissionError(f"{args[0]} is outside the sandbox")
+    elif event in LIST_EVENTS:
+        if not _inside(args[0], READABLE):
+            raise PermissionError(f"{args[0]} is outside the sandbox")
+    elif event in WRITE_EVENTS:
+        if not all(_inside(args[i]) for i in WRITE_EVENTS[event]):
+            raise PermissionError(f"{event} outside the sandbox is not allowed")
+    elif event not in ALLOWED_EVENTS:
+        raise PermissionError(f"{event} is not allowed in the sandbox")
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit] + "\n... (truncated)"
+
+
+def _describe(error, source):
+    """
+    Traceback limited to the submission's frames, with lines taken from
+    the source itself (linecache would need files outside the sandbox).
+    """
+
+    lines = source.splitlines()
+    parts = ["Traceback (most recent call last):"]
+
+    for frame, lineno in traceback.walk_tb(error.__traceback__):
+        if frame.f_code.co_filename != "submission.py":
+            continue
+        parts.append(f"  line {lineno}, in {frame.f_code.co_name}")
+        if 0 < lineno <= len(lines):
+            parts.append(f"    {lines[lineno - 1].strip()}")
+
+    parts.append(f"{type(error).__name__}: {error}")
+    return "\n".join(parts)
+
+
+def run(job, output_chars):
+    """
+    Runs the job in this (child) process. Returns the raw report: the
+    status, and which of the requested names the code defined.
+    """
+
+    report = {"status": "passed", "stdout": "", "error": None, "line": None, "defined": []}
+
+    try:
+        code = compile(job["code"], "submission.py", "exec")
+    except SyntaxError as e:
+        report["status"] = "syntax_error"
+        report["error"] = f"{type(e).__name__} at line {e.lineno}: {e.msg}"
+        report["line"] = e.lineno
+        return report
+
+    namespace = {"__name__": "__main__", "__builtins__": builtins}
+    stdout = io.StringIO()
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stdout):
+        try:
+            exec(code, namespace)
+        except EOFError:
+            # Reads input(): cannot be judged without the expected input
+            report["status"] = "needs_input"
+        except MemoryError:
+            report["status"] = "runtime_error"
+            report["error"] = "MemoryError: memory limit exceeded"
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                report["status"] = "runtime_error"
+                report["error"] = f"SystemExit: {e.code}"
+        except BaseException as e:
+            report["status"] = "runtime_error"
+            report["error"] = _describe(e, job["code"])[-output_chars:]
+
+    report["stdout"] = _truncate(stdout.getvalue(), output_chars)
+    report["defined"] = [name for name in job.get("names", []) if namespace.get(name) is not None]
+    return report
+
+
+def _child(job, limits, report_fd):
+    # Nothing of the server's pipes stays reachable: fds 0-2 go to /dev/null
+    try:
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        sys.stdin = io.StringIO("")
+
+        apply_limits(limits)
+        sys.addaudithook(deny)
+
+        started = time.perf_counter()
+        report = run(job, limits["outputChars"])
+        report["durationMs"] = round((time.perf_counter() - started) * 1000)
+
+        with os.fdopen(report_fd, "w") as out:
+            out.write(json.dumps(report))
+    finally:
+        os._exit(0)
+
+
+def _read_report(fd, limit):
+    chunks, size = [], 0
+    with os.fdopen(fd, "rb") as reader:
+        while size <= limit:
+            chunk = reader.read(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+    return b"".join(chunks) if size <= limit else None
+
+
+def _result(raw, names, output_chars):
+    """
+    The child's report as a result, keeping only what a run can produce:
+    a known status, bounded text, checks for the requested names only.
+    None when it is not a report. Submitted code can write to the pipe,
+    so nothing in it is trusted beyond its shape.
+    """
+
+    try:
+        report = json.loads(raw)
+        status = report["status"]
+        error = report.get("error")
+        stdout = report.get("stdout") or ""
+        defined = set(report.get("defined") or ())
+        line = report.get("line")
+        duration = report.get("durationMs")
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+    if (
+        status not in STATUSES
+        or not isinstance(error, (str, type(None)))
+        or not isinstance(stdout, str)
+        or not isinstance(line, (int, type(None)))
+        or not isinstance(duration, (int, float))
+    ):
+        return None
+
+    return {
+        "status": status,
+        "stdout": _truncate(stdout, output_chars),
+        "error": error[-output_chars:] if error else None,
+        "line": line,
+        "checks": [
+            {
+                "check": f"defines {name}",
+                "passed": name in defined,
+                "detail": None if name in defined else f"{name} is not defined at module level"
+            }
+            for name in names
+        ],
+        "durationMs": duration
+    }
+
+
+def main():
+    limits = json.loads(sys.argv[1])
+
+    line = sys.stdin.readline()
+    if not line:
+        return
+    job = json.loads(line)
+    names = [name for name in job.get("names", []) if isinstance(name, str)]
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        _child(job, limits, write_end)
+    os.close(write_end)
+
+    raw = _read_report(read_end, 4 * limits["outputChars"] + 65536)
+    if raw is None:
+        os.kill(pid, signal.SIGKILL)
+    _, wait_status = os.waitpid(pid, 0)
+
+    result = _result(raw, names, limits["outputChars"]) if raw else None
+    if result is None:
+        if os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) == signal.SIGXCPU:
+            result = {"status": "timeout", "error": f"CPU limit of {limits['cpuSeconds']}s exceeded", "checks": []}
+        else:
+            code = os.waitstatus_to_exitcode(wait_status)
+            result = {"status": "crashed", "error": f"Sandbox exited with {code}", "checks": []}
+
+    sys.stdout.write(json.dumps(result))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import fastjsonschema
+from fastjsonschema import JsonSchemaValueException
+
+# Declarative shapes for request bodies and AI output, compiled once at
+# import into plain Python validators. Cross-field rules JSON Schema
+# cannot express (e.g. tasks referencing existing weeks) stay in the
+# callers.
+
+SKILL_LEVELS = ["beginner", "intermediate", "advanced"]
+CONTENT_TYPES = ["learning", "coding"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+# Longest plan accepted: weeks are generated (and paid for) one LLM call
+# each on the chunked path
+MAX_PLAN_WEEKS = 26
+
+NON_EMPTY = {"type": "string", "pattern": "\\S"}
+OBJECT_ID = {"type": "string", "pattern": "^[0-9a-fA-F]{24}$"}
+WEEK_NUMBER = {"type": "integer", "minimum": 1, "maximum": MAX_PLAN_WEEKS}
+DURATION_WEEKS = {"type": "integer", "minimum": 1, "maximum": MAX_PLAN_WEEKS}
+DAYS_PER_WEEK = {"type": "integer", "minimum": 1, "maximum": 7}
+
+# Readable wording for pattern failures
+_PATTERN_RULES = {
+    NON_EMPTY["pattern"]: "must not be empty",
+    OBJECT_ID["pattern"]: "must be a 24-character hex id"
+}
+
+
+class SchemaError(RuntimeError):
+    """
+    A value failed its schema. `path` locates it, e.g. "tasks[3].difficulty"
+    ("" for the document itself).
+
+    A RuntimeError so AI output failures flow through the same
+    forget/retry handling as every other generation error.
+    """
+
+    def __init__(self, subject, path, rule):
+        location = f"{path} " if path else ""
+        super().__init__(f"{subject}: {location}{rule}" if subject else f"{location}{rule}")
+        self.path = path
+        self.rule = rule
+
+
+class Schema:
+    def __init__(self, subject, schema):
+        self.subject = subject
+        self.schema = schema
+        self._validate = fastjsonschema.compile(schema)
+
+    def validate(self, data):
+        """
+        Returns `data` unchanged or raises SchemaError.
+        """
+
+        try:
+            return self._validate(data)
+        except JsonSchemaValueException as e:
+            path = e.name.removeprefix("data").removeprefix(".")
+            rule = e.message.removeprefix(e.name).strip()
+            if e.rule == "pattern":
+                rule = _PATTERN_RULES.get(e.rule_definition, rule)
+            raise SchemaError(self.subject, path, rule) from None
+
+    def error(self, data):
+        """
+        Request-body flavour: the error message, or None when valid.
+        """
+
+        try:
+            self.validate(data)
+        except SchemaError as e:
+            if not e.path:
+                return f"request body {e.rule}"
+            return str(e)
+        return None
+
+
+# ---------- request bodies ----------
+
+GENERATE_REQUEST = Schema("", {
+    "type": "object",
+    "required": ["domain", "title", "durationWeeks", "daysPerWeek", "skills"],
+    "properties": {
+        "domain": NON_EMPTY,
+        "title": NON_EMPTY,
+        "durationWeeks": DURATION_WEEKS,
+        "daysPerWeek": DAYS_PER_WEEK,
+        "skills": {
+            "type": "array",
+            "items": {
+                "type": "array",
+                "items": [NON_EMPTY, {"enum": SKILL_LEVELS}],
+                "minItems": 2,
+                "maxItems": 2
+            }
+        }
+    }
+})
+
+SUBMISSION_REQUEST = Schema("", {
+    "type": "object",
+    "required": ["internshipId", "taskId", "taskDescription", "submittedData"],
+    "properties": {
+        "internshipId": OBJECT_ID,
+        "taskId": OBJECT_ID,
+        "taskDescription": NON_EMPTY,
+        "submittedData": NON_EMPTY
+    }
+})
+
+SKILL_REQUEST = Schema("", {
+    "type": "object",
+    "required": ["skill", "level"],
+    "properties": {
+        "skill": NON_EMPTY,
+        "level": NON_EMPTY
+    }
+})
+
+CREDENTIALS_REQUEST = Schema("", {
+    "type": "object",
+    "required": ["email", "password"],
+    "properties": {
+        "email": NON_EMPTY,
+        "password": {"type": "string", "minLength": 1}
+    }
+})
+
+# ---------- AI output ----------
+
+_INTERNSHIP = {
+    "type": "object",
+    "required": ["domain", "title", "durationWeeks", "daysPerWeek"],
+    "properties": {
+        "domain": {"type": "string"},
+        "title": NON_EMPTY,
+        "durationWeeks": DURATION_WEEKS,
+        "daysPerWeek": DAYS_PER_WEEK,
+        "status": {"type": "string"}
+    }
+}
+
+_WEEK = {
+    "type": "object",
+    "required": ["weekNumber", "learningObjectives"],
+    "properties": {
+        "weekNumber": WEEK_NUMBER,
+        "learningObjectives": NON_EMPTY
+    }
+}
+
+_TASK = {
+    "type": "object",
+    "required": [
+        "weekNumber",
+        "title",
+        "contentType",
+        "description",
+        "expectedDeliverables",
+        "estimatedHours",
+        "difficulty"
+    ],
+    "properties": {
+        "weekNumber": WEEK_NUMBER,
+        "title": NON_EMPTY,
+        "contentType": {"enum": CONTENT_TYPES},
+        "description": NON_EMPTY,
+        "expectedDeliverables": {"type": "string"},
+        "estimatedHours": {"type": "number", "minimum": 0},
+        "difficulty": {"enum": DIFFICULTIES}
+    }
+}
+
+AI_INTERNSHIP = Schema("AI internship", _INTERNSHIP)
+AI_WEEK = Schema("AI week", _WEEK)
+AI_TASK = Schema("AI task", _TASK)
+
+AI_PLAN = Schema("AI plan", {
+    "type": "object",
+    "required": ["internship", "weekly_plans", "tasks"],
+    "properties": {
+        "internship": _INTERNSHIP,
+        "weekly_plans": {"type": "array", "minItems": 1, "items": _WEEK},
+        "tasks": {"type": "array", "minItems": 1, "items": _TASK}
+    }
+})
+
+AI_SKELETON = Schema("AI skeleton", {
+    "type": "object",
+    "required": ["internship", "weekly_plans"],
+    "properties": {
+        "internship": _INTERNSHIP,
+        "weekly_plans": {"type": "array", "minItems": 1, "items": _WEEK}
+    }
+})
+
+AI_WEEK_TASKS = Schema("AI week", {
+    "type": "object",
+    "required": ["tasks"],
+    "properties": {
+        "tasks": {"type": "array", "items": _TASK}
+    }
+})
+
+AI_FEEDBACK = Schema("AI feedback", {
+    "type": "object",
+    "required": ["strengths", "weaknesses", "improvements", "recommendedNextSteps"],
+    "properties": {
+        key: {"type": "array", "minItems": 1, "items": NON_EMPTY}
+        for key in ["strengths", "weaknesses", "improvements", "recommendedNextSteps"]
+    }
+})
+
+# Envelope only: each result is checked against AI_FEEDBACK on its own,
+# so one bad entry does not void the rest of the batch
+AI_FEEDBACK_BATCH = Schema("AI feedback batch", {
+    "type": "object",
+    "required": ["results"],
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["id"],
+                "properties": {"id": {"type": ["string", "integer"]}}
+            }
+        }
+    }
+})
@@ -3,6 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson.objectid import ObjectId
 from datetime import datetime
 from app.db import user_skills_col
+from app.pagination import PageError, paginate, page_response
+from app.user_cache import user_cache, SKILLS
+from app.schemas import SKILL_REQUEST
 
 skills_bp = Blueprint("skills", __name__)
 
@@ -13,8 +16,9 @@ def add_skill():
     user_id = get_jwt_identity()
     data = request.json
 
-    if not data or "skill" not in data or "level" not in data:
-        return jsonify({"error": "skill and level required"}), 400
+    error = SKILL_REQUEST.error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
     doc = {
         "userId": ObjectId(user_id),
@@ -24,9 +28,8 @@ def add_skill():
         "createdAt": datetime.utcnow()
     }
 
-    result = user_skills_col.insert_one(doc)
-    doc["_id"] = str(result.inserted_id)
-    doc["userId"] = user_id
+    user_skills_col.insert_one(doc)
+    user_cache.invalidate(user_id, SKILLS)
 
     return jsonify(doc), 201
 
@@ -36,13 +39,17 @@ def add_skill():
 def get_skills():
     user_id = get_jwt_identity()
 
-    skills = []
-    for s in user_skills_col.find({"userId": ObjectId(user_id)}):
-        s["_id"] = str(s["_id"])
-        s["userId"] = user_id
-        skills.append(s)
+    try:
+        skills, next_cursor = user_cache.get_or_load(
+            user_id,
+            SKILLS,
+            lambda: paginate(user_skills_col, {"userId": ObjectId(user_id)}),
+            variant=request.query_string.decode()
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify(skills), 200
+    return page_response(skills, next_cursor)
 
 
 @skills_bp.route("/skills/<skill_id>", methods=["DELETE"])
@@ -58,4 +65,6 @@ def delete_skill(skill_id):
     if result.deleted_count == 0:
         return jsonify({"error": "Skill not found"}), 404
 
+    user_cache.invalidate(user_id, SKILLS)
+
     return jsonify({"message": "Skill removed"}), 200
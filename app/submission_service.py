@@ -1,35 +1,156 @@
 from bson import ObjectId
 from datetime import datetime
+from dotenv import load_dotenv
+import os
 
-from app.db import submissions_col, feedback_col
-from app.ai.feedback import generate_feedback
+from app import async_db
+from app.db import submissions_col
+from app.ai import tokens
+from app.ai.feedback_batch import feedback_batcher
+from app.job_service import enqueue, register
+from app.feedback_notifier import feedback_notifier
+from app.sandbox import grade, sandbox_pool
 
+load_dotenv()
 
-async def submit_and_evaluate(user_id, payload):
+# Max feedback evaluations in flight per worker process; also caps how
+# many submissions can meet in one feedback batch
+EVALUATION_CONCURRENCY = int(os.getenv("EVALUATION_CONCURRENCY", "8"))
+
+
+def create_submission(user_id, payload, bypass_cache=False):
+    """
+    Stores the submission and queues its evaluation.
+    Feedback is produced later by evaluate_submission.
+    """
+
+    now = datetime.utcnow()
     submission = {
         "userId": ObjectId(user_id),
         "internshipId": ObjectId(payload["internshipId"]),
         "taskId": ObjectId(payload["taskId"]),
+        "taskDescription": payload["taskDescription"],
         "submittedData": payload["submittedData"],
         "status": "submitted",
-        "submittedAt": datetime.utcnow()
+        "submittedAt": now,
+        "updatedAt": now
     }
 
-    submission_res = submissions_col.insert_one(submission)
-    submission_id = submission_res.inserted_id
+    submission_id = submissions_col.insert_one(submission).inserted_id
 
-    feedback = await generate_feedback({
-        "taskDescription": payload["taskDescription"],
-        "submittedCode": payload["submittedData"]
-    })
-
-    feedback_col.insert_one({
-        "submissionId": submission_id,
-        "strengths": feedback["strengths"],
-        "weaknesses": feedback["weaknesses"],
-        "improvements": feedback["improvements"],
-        "recommendedNextSteps": feedback["recommendedNextSteps"],
-        "createdAt": datetime.utcnow()
-    })
+    enqueue(
+        "evaluate_submission",
+        user_id,
+        {"submissionId": submission_id},
+        options={"bypassCache": bypass_cache}
+    )
 
     return submission_id
+
+
+async def _set_status(submission_id, status, **fields):
+    await async_db.submissions_col.update_one(
+        {"_id": submission_id},
+        {"$set": {"status": status, "updatedAt": datetime.utcnow(), **fields}}
+    )
+
+
+async def mark_failed(job, error):
+    submission_id = job["payload"]["submissionId"]
+    await _set_status(submission_id, "failed", error=str(error))
+    # Waiters stop parking; they will see the failed status
+    feedback_notifier.publish(submission_id)
+
+
+async def _grade(submission):
+    """
+    Sandbox result for the submission, stored on it; None for learning
+    tasks and code the sandbox cannot run. Deterministic, so a retried
+    job reuses the stored result.
+    """
+
+    if "grading" in submission:
+        return submission["grading"]
+
+    task = await async_db.tasks_col.find_one({"_id": submission["taskId"]}, {"contentType": 1})
+    if task and task.get("contentType") != "coding":
+        return None
+
+    try:
+        grading = await grade(submission["taskDescription"], submission["submittedData"])
+    except Exception as e:
+        # A broken sandbox must not fail the evaluation: the LLM judges alone
+        sandbox_pool.stats["failures"] += 1
+        print(f"Sandbox grading of {submission['_id']} failed: {e}")
+        return None
+
+    if grading is not None:
+        await async_db.submissions_col.update_one(
+            {"_id": submission["_id"]},
+            {"$set": {"grading": grading}}
+        )
+    return grading
+
+
+def _compile_error_feedback(grading) -> dict:
+    # No model call for code that does not even compile
+    return {
+        "strengths": [
+            "Not assessed yet: the code does not compile, so it could not be run or reviewed."
+        ],
+        "weaknesses": [grading["error"]],
+        "improvements": [f"Fix the {grading['error']} and resubmit."],
+        "recommendedNextSteps": [
+            "Run your file locally before submitting so syntax errors show up immediately."
+        ]
+    }
+
+
+@register("evaluate_submission", concurrency=EVALUATION_CONCURRENCY, on_failure=mark_failed)
+async def evaluate_submission(job):
+    submission_id = job["payload"]["submissionId"]
+
+    submission = await async_db.submissions_col.find_one({"_id": submission_id})
+    if not submission:
+        raise RuntimeError(f"Submission {submission_id} no longer exists")
+
+    await _set_status(submission_id, "evaluating")
+
+    grading = await _grade(submission)
+
+    with tokens.tracking() as usage:
+        if grading and grading["status"] == "syntax_error":
+            source = "sandbox"
+            feedback = _compile_error_feedback(grading)
+        else:
+            source = "llm"
+            feedback = await feedback_batcher.evaluate(
+                (submission["taskId"], submission["taskDescription"]),
+                {
+                    "taskDescription": submission["taskDescription"],
+                    "submittedCode": submission["submittedData"],
+                    "execution": grading
+                },
+                bypass_cache=job["options"].get("bypassCache", False)
+            )
+
+    # Upsert keeps a retried job from tripping the unique submissionId index
+    await async_db.feedback_col.update_one(
+        {"submissionId": submission_id},
+        {"$setOnInsert": {
+            "submissionId": submission_id,
+            "strengths": feedback["strengths"],
+            "weaknesses": feedback["weaknesses"],
+            "improvements": feedback["improvements"],
+            "recommendedNextSteps": feedback["recommendedNextSteps"],
+            "source": source,
+            "createdAt": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+    # Cache hits count as zero requests
+    await _set_status(submission_id, "evaluated", evaluatedAt=datetime.utcnow(), usage=usage)
+    feedback_notifier.publish(submission_id)
+
+    return {"submissionId": str(submission_id), "usage": usage}
@@ -1,13 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-import asyncio
 
-from app.db import submissions_col, feedback_col
-from app.submission_service import submit_and_evaluate
+from app import async_db
+from app.db import submissions_col
+from app.feedback_notifier import FEEDBACK_WAIT_MAX, FEEDBACK_WAIT_MAX_WSGI, feedback_notifier
+from app.submission_service import create_submission
+from app.pagination import PageError, paginate, page_response
+from app.conditional import IMMUTABLE, conditional, etag_for
+from app.schemas import SUBMISSION_REQUEST
 
 submissions_bp = Blueprint("submissions", __name__)
 
+# Source code / task text / program output left out of list views unless requested
+SUBMISSION_SUMMARY_EXCLUDE = ("submittedData", "taskDescription", "grading.stdout")
+
 
 @submissions_bp.route("", methods=["POST"])
 @jwt_required()
@@ -15,15 +22,15 @@ def create_submission_api():
     user_id = get_jwt_identity()
     data = request.json or {}
 
-    required = ["internshipId", "taskId", "taskDescription", "submittedData"]
-    for r in required:
-        if r not in data:
-            return jsonify({"error": f"{r} is required"}), 400
+    error = SUBMISSION_REQUEST.error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    submission_id = loop.run_until_complete(
-        submit_and_evaluate(user_id, data)
+    # Feedback is generated in the background; poll /<id>/feedback
+    submission_id = create_submission(
+        user_id,
+        data,
+        bypass_cache=request.args.get("nocache") == "1"
     )
 
     return jsonify({
@@ -46,27 +53,56 @@ def get_submission(submission_id):
     if not submission:
         return jsonify({"error": "Submission not found"}), 404
 
-    submission["_id"] = str(submission["_id"])
-    submission["userId"] = str(submission["userId"])
-    submission["internshipId"] = str(submission["internshipId"])
-    submission["taskId"] = str(submission["taskId"])
-
-    return jsonify(submission), 200
+    # Status moves submitted -> evaluating -> evaluated: revalidate
+    return conditional(etag_for([submission]), lambda: jsonify(submission))
 
 
 @submissions_bp.route("/<submission_id>/feedback", methods=["GET"])
 @jwt_required()
-def get_feedback(submission_id):
+async def get_feedback(submission_id):
+    """
+    `?wait=N` long-polls: the request is parked for up to N seconds
+    until the feedback is stored, instead of answering 404 right away.
+    409 once the evaluation has failed.
+
+    The wait holds the handler thread, so N is capped at
+    FEEDBACK_WAIT_MAX (30s) under asgi.py, where handlers run on the
+    ASGI_THREADS pool, and at FEEDBACK_WAIT_MAX_WSGI (10s) under a
+    plain WSGI server, where it ties up a worker thread.
+    """
+
     fid = ObjectId(submission_id)
+    # a2wsgi (asgi.py) passes the ASGI scope along
+    limit = FEEDBACK_WAIT_MAX if "asgi.scope" in request.environ else FEEDBACK_WAIT_MAX_WSGI
+
+    try:
+        wait = min(float(request.args.get("wait", 0)), limit)
+    except ValueError:
+        return jsonify({"error": "wait must be a number"}), 400
+
+    owned = {"_id": fid, "userId": ObjectId(get_jwt_identity())}
+
+    submission = await async_db.submissions_col.find_one(owned, {"status": 1})
+    if not submission:
+        return jsonify({"error": "Submission not found"}), 404
+    if submission["status"] == "failed":
+        return jsonify({"error": "Evaluation failed"}), 409
+
+    if wait > 0:
+        feedback = await feedback_notifier.wait(fid, wait)
+    else:
+        feedback = await async_db.feedback_col.find_one({"submissionId": fid})
 
-    feedback = feedback_col.find_one({"submissionId": fid})
     if not feedback:
+        # Woken without feedback: the evaluation gave up while we waited
+        if wait > 0:
+            submission = await async_db.submissions_col.find_one(owned, {"status": 1})
+            if submission and submission["status"] == "failed":
+                return jsonify({"error": "Evaluation failed"}), 409
         return jsonify({"error": "Feedback not ready"}), 404
 
-    feedback["_id"] = str(feedback["_id"])
-    feedback["submissionId"] = str(feedback["submissionId"])
-
-    return jsonify(feedback), 200
+    # Written once ($setOnInsert) and never updated
+    return conditional(etag_for([feedback]), lambda: jsonify(feedback), IMMUTABLE)
 
 
 @submissions_bp.route("/tasks/<task_id>/submissions", methods=["GET"])
@@ -75,14 +111,16 @@ def get_task_submissions(task_id):
     tid = ObjectId(task_id)
     user_id = ObjectId(get_jwt_identity())
 
-    submissions = []
-    for s in submissions_col.find({
-        "taskId": tid,
-        "userId": user_id
-    }):
-        s["_id"] = str(s["_id"])
-        s["taskId"] = str(s["taskId"])
-        s["internshipId"] = str(s["internshipId"])
-        submissions.append(s)
-
-    return jsonify(submissions), 200
+    try:
+        submissions, next_cursor = paginate(
+            submissions_col,
+            {"taskId": tid, "userId": user_id},
+            summary_exclude=SUBMISSION_SUMMARY_EXCLUDE
+        )
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return conditional(
+        etag_for(submissions),
+        lambda: page_response(submissions, next_cursor)
+    )
@@ -0,0 +1,341 @@
+from dotenv import load_dotenv
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+import asyncio
+import bson
+import os
+import sqlite3
+import threading
+import time
+
+from app import metrics
+from app.db import cache_generations_col
+from app.runtime import runtime
+
+load_dotenv()
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1") == "1"
+# Max (user, namespace) groups held in memory
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "2048"))
+# Max cached variants (query strings) per group, e.g. pages of a list
+USER_CACHE_MAX_VARIANTS = int(os.getenv("USER_CACHE_MAX_VARIANTS", "8"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+# Path of a sqlite file sharing cached values between the workers on one
+# host; empty disables it (generations are always shared, through MongoDB)
+USER_CACHE_SQLITE = os.getenv("USER_CACHE_SQLITE", "")
+# How stale a worker's view of other workers' invalidations may get
+USER_CACHE_GENERATION_SYNC = float(os.getenv("USER_CACHE_GENERATION_SYNC", "2"))
+# Overlap between incremental syncs, covering clock skew between hosts
+GENERATION_SYNC_OVERLAP = timedelta(seconds=30)
+
+PROFILE = "profile"
+SKILLS = "skills"
+INTERNSHIPS = "internships"
+
+
+class UserCache:
+    """
+    Read-through cache for per-user views that change rarely.
+
+    Entries are grouped by (user id, namespace); a write invalidates the
+    whole group. Each group has a generation number bumped on every
+    invalidation, so a load that raced with a write is never stored.
+
+    Generations live in MongoDB (cache_generations) and are mirrored in
+    memory, like the token revocation list: reads never touch MongoDB, a
+    write bumps the generation there and locally at once, and a refresher
+    on the runtime loop pulls other workers' bumps every
+    USER_CACHE_GENERATION_SYNC seconds. Until the first sync of a process
+    nothing is cached.
+
+    - L1: in-process LRU over groups, with TTL
+    - shared (optional): sqlite file used by all workers on the host
+    """
+
+    def __init__(self, max_entries, max_variants, ttl, sqlite_path="", sync_interval=2):
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.ttl = ttl
+        self.sqlite_path = sqlite_path
+        self.sync_interval = sync_interval
+
+        # (user, ns) -> (gen, bumped at); only bumps younger than the TTL,
+        # older ones cannot have cached entries left to tell apart
+        self._generations = {}
+        self._cursor = None     # newest updatedAt seen
+        self._synced = False
+        self._pid = None
+
+        self._groups = OrderedDict()  # (user, ns) -> {variant: (gen, expires_at, value)}
+        self._lock = threading.Lock()
+
+        self._conn = None
+        self._conn_pid = None
+        self._conn_lock = threading.Lock()
+
+        self.stats = {
+            "hits": 0,
+            "sharedHits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "staleLoads": 0,
+            "syncs": 0,
+            "syncErrors": 0
+        }
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._generations = {}
+            self._cursor = None
+            self._synced = False
+            runtime.spawn(self._refresher())
+
+    def _count(self, name):
+        # Request threads and the loop update counters concurrently
+        with self._lock:
+            self.stats[name] += 1
+
+    # ---------- shared backend ----------
+
+    def _db(self):
+        # One connection per process; sqlite handles must not cross a fork
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.sqlite_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "user_id TEXT, namespace TEXT, variant TEXT, gen INTEGER, "
+                "expires_at REAL, value BLOB, "
+                "PRIMARY KEY (user_id, namespace, variant))"
+            )
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _shared(self, sql, params=(), fetch=False):
+        with self._conn_lock:
+            conn = self._db()
+            cur = conn.execute(sql, params)
+            if fetch:
+                return cur.fetchone()
+            conn.commit()
+
+    # ---------- generations ----------
+
+    @staticmethod
+    def _generation_id(group) -> str:
+        return ":".join(group)
+
+    def _generation(self, group) -> int:
+        entry = self._generations.get(group)
+        return entry[0] if entry else 0
+
+    def _set_generation(self, group, gen, bumped_at):
+        # Never backwards: a sync may carry an older value than a local bump
+        with self._lock:
+            if gen > self._generation(group):
+                self._generations[group] = (gen, bumped_at)
+
+    def _bump_update(self, group):
+        return (
+            {"_id": self._generation_id(group)},
+            {"$inc": {"gen": 1}, "$set": {"updatedAt": datetime.utcnow()}}
+        )
+
+    def _bumped(self, group, doc):
+        self._set_generation(group, doc["gen"], time.time())
+        with self._lock:
+            self._groups.pop(group, None)
+            self.stats["invalidations"] += 1
+
+    async def _refresher(self):
+        while True:
+            await self._sync()
+            await asyncio.sleep(self.sync_interval)
+
+    async def _sync(self):
+        from app import async_db
+
+        try:
+            since = datetime.utcnow() - timedelta(seconds=self.ttl)
+            if self._cursor is not None:
+                since = max(since, self._cursor - GENERATION_SYNC_OVERLAP)
+
+            async for doc in async_db.cache_generations_col.find({"updatedAt": {"$gte": since}}):
+                user_id, _, namespace = doc["_id"].partition(":")
+                self._set_generation((user_id, namespace), doc["gen"], time.time())
+                if self._cursor is None or doc["updatedAt"] > self._cursor:
+                    self._cursor = doc["updatedAt"]
+
+            # Pruned in place: a bump landing meanwhile must not be lost
+            cutoff = time.time() - self.ttl
+            with self._lock:
+                for group in [g for g, (_, bumped_at) in self._generations.items() if bumped_at < cutoff]:
+                    self._generations.pop(group, None)
+                self._synced = True
+                self.stats["syncs"] += 1
+        except PyMongoError as e:
+            # Retried next interval
+            self._count("syncErrors")
+            print(f"User cache generation sync failed: {e}")
+
+    # ---------- L1 ----------
+
+    def _get_local(self, group, variant, gen):
+        with self._lock:
+            entries = self._groups.get(group)
+            entry = entries.get(variant) if entries else None
+            if entry is None:
+                return None
+
+            entry_gen, expires_at, value = entry
+            if entry_gen != gen:
+                del entries[variant]
+                return None
+            if expires_at < time.time():
+                del entries[variant]
+                self.stats["expirations"] += 1
+                return None
+
+            self._groups.move_to_end(group)
+            return value
+
+    def _put_local(self, group, variant, gen, expires_at, value):
+        with self._lock:
+            entries = self._groups.setdefault(group, OrderedDict())
+            entries[variant] = (gen, expires_at, value)
+            entries.move_to_end(variant)
+            while len(entries) > self.max_variants:
+                entries.popitem(last=False)
+
+            self._groups.move_to_end(group)
+            while len(self._groups) > self.max_entries:
+                self._groups.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    # ---------- public ----------
+
+    def get_or_load(self, user_id, namespace, loader, variant=""):
+        """
+        Returns the cached value for (user_id, namespace, variant), or
+        calls `loader()` and caches its result. Cached values are shared
+        between requests and must not be mutated.
+        """
+
+        if not USER_CACHE_ENABLED:
+            return loader()
+
+        self.ensure_started()
+        if not self._synced:
+            self._count("misses")
+            return loader()
+
+        group = (str(user_id), namespace)
+        gen = self._generation(group)
+
+        value = self._get_local(group, variant, gen)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.sqlite_path:
+            row = self._shared(
+                "SELECT expires_at, value FROM entries "
+                "WHERE user_id = ? AND namespace = ? AND variant = ? AND gen = ?",
+                (*group, variant, gen),
+                fetch=True
+            )
+            if row and row[0] > time.time():
+                value = bson.decode(row[1])["v"]
+                self._put_local(group, variant, gen, row[0], value)
+                self._count("sharedHits")
+                return value
+
+        self._count("misses")
+        value = loader()
+
+        # A write landed while loading: serve the result, don't keep it
+        if self._generation(group) != gen:
+            self._count("staleLoads")
+            return value
+
+        expires_at = time.time() + self.ttl
+        self._put_local(group, variant, gen, expires_at, value)
+
+        if self.sqlite_path:
+            self._shared(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (*group, variant, gen, expires_at, bson.encode({"v": value}))
+            )
+            # Older generations can never be read again
+            self._shared(
+                "DELETE FROM entries WHERE user_id = ? AND namespace = ? AND gen < ?",
+                (*group, gen)
+            )
+
+        return value
+
+    def invalidate(self, user_id, *namespaces):
+        """
+        Drops every cached variant of the given namespaces for a user.
+        Call after the write has been acknowledged. Blocking: code on the
+        event loop uses ainvalidate().
+        """
+
+        self.ensure_started()
+        for namespace in namespaces:
+            group = (str(user_id), namespace)
+            doc = cache_generations_col.find_one_and_update(
+                *self._bump_update(group), upsert=True, return_document=ReturnDocument.AFTER
+            )
+            self._bumped(group, doc)
+
+    async def ainvalidate(self, user_id, *namespaces):
+        """
+        invalidate() for coroutines, through the async driver.
+        """
+
+        from app import async_db
+
+        self.ensure_started()
+        for namespace in namespaces:
+            group = (str(user_id), namespace)
+            doc = await async_db.cache_generations_col.find_one_and_update(
+                *self._bump_update(group), upsert=True, return_document=ReturnDocument.AFTER
+            )
+            self._bumped(group, doc)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["sharedHits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hitRate": round((lookups - self.stats["misses"]) / lookups, 4) if lookups else 0.0,
+                "groups": len(self._groups),
+                "shared": bool(self.sqlite_path),
+                "enabled": USER_CACHE_ENABLED
+            }
+
+
+user_cache = UserCache(
+    max_entries=USER_CACHE_MAX_ENTRIES,
+    max_variants=USER_CACHE_MAX_VARIANTS,
+    ttl=USER_CACHE_TTL,
+    sqlite_path=USER_CACHE_SQLITE,
+    sync_interval=USER_CACHE_GENERATION_SYNC
+)
+
+metrics.register("userCache", user_cache.snapshot)
@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
+from app.auth import access_token_for
 from app.db import users_col
+from app.user_cache import user_cache, PROFILE
 
 users_bp = Blueprint("users", __name__)
 
@@ -12,14 +15,21 @@ users_bp = Blueprint("users", __name__)
 def get_profile():
     user_id = get_jwt_identity()
 
-    user = users_col.find_one({"_id": ObjectId(user_id)})
+    # Access tokens carry the profile as of their issue (at most
+    # JWT_ACCESS_MINUTES old); ?fresh=1 reads the database instead
+    profile = get_jwt().get("profile")
+    if profile is not None and request.args.get("fresh") != "1":
+        return jsonify({"_id": user_id, **profile}), 200
+
+    user = user_cache.get_or_load(
+        user_id,
+        PROFILE,
+        lambda: users_col.find_one({"_id": ObjectId(user_id)}, {"passwordHash": 0})
+    )
 
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    user["_id"] = str(user["_id"])
-    del user["passwordHash"]
-
     return jsonify(user), 200
 
 
@@ -44,9 +54,18 @@ def update_profile():
 
     update_data["updatedAt"] = datetime.utcnow()
 
-    users_col.update_one(
+    user = users_col.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"passwordHash": 0},
+        return_document=ReturnDocument.AFTER
     )
+    user_cache.invalidate(user_id, PROFILE)
+
+    # The caller's token now carries outdated claims: hand back a fresh one
+    response = {"message": "Profile updated"}
+    family = get_jwt().get("fam")
+    if user and family:
+        response["accessToken"] = access_token_for(user, family)
 
-    return jsonify({"message": "Profile updated"}), 200
+    return jsonify(response), 200
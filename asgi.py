@@ -0,0 +1,36 @@
+from a2wsgi import WSGIMiddleware
+import asyncio
+import os
+
+from app import create_app
+from app.ai.client import LLM_MAX_CONNECTIONS
+from app.runtime import runtime
+
+# Threads serving the (sync) Flask request handlers; async work they
+# hand off runs on the server's event loop. Every in-flight request,
+# including one parked on an LLM call or a ?wait= long-poll, holds a
+# thread, so this caps a worker's concurrent requests. By default there
+# is room for every pooled LLM connection to be busy several times over.
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", str(4 * LLM_MAX_CONNECTIONS)))
+
+flask_app = create_app()
+wsgi_app = WSGIMiddleware(flask_app, workers=ASGI_THREADS)
+
+
+async def app(scope, receive, send):
+    if scope["type"] != "lifespan":
+        await wsgi_app(scope, receive, send)
+        return
+
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            # One long-lived loop per worker: the server's own
+            runtime.attach(asyncio.get_running_loop())
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            await runtime.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,127 @@
+"""
+app.ai.json_repair: repairs of malformed model output, closing of
+truncated objects and the continuation loop of parse_agent_json.
+"""
+
+import json
+
+import pytest
+
+from app.ai import json_repair
+from app.ai.json_repair import TruncatedJSON, extract_json, parse_agent_json
+from app.runtime import runtime
+
+
+class StubAgent:
+    """
+    Answers continue_from() with the queued tails, in order.
+    """
+
+    name = "stub"
+
+    def __init__(self, *tails):
+        self.tails = list(tails)
+        self.partials = []
+        self.remembered = None
+
+    async def continue_from(self, prompt, partial):
+        self.partials.append(partial)
+        return self.tails.pop(0)
+
+    async def remember(self, prompt, content):
+        self.remembered = json.loads(content)
+
+
+def closed(raw):
+    with pytest.raises(TruncatedJSON) as info:
+        extract_json(raw)
+    return info.value.closed
+
+
+def test_clean_and_fenced_objects():
+    assert extract_json('{"a": 1}') == ({"a": 1}, "clean")
+    assert extract_json('```json\n{"a": [1, 2]}\n```') == ({"a": [1, 2]}, "clean")
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('Here you go: {"a": 1} Hope it helps!', {"a": 1}),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('{"a": "x" "b": "y"}', {"a": "x", "b": "y"}),
+    ('{"a": True, "b": None} // done', {"a": True, "b": None}),
+    ('{/* note */ "a": "line one\nline two"}', {"a": "line one\nline two"}),
+    ('Note: {"a": "brace } and \\"quote\\""}', {"a": 'brace } and "quote"'}),
+    ('{"a": {"b": 1]}', {"a": {"b": 1}}),
+])
+def test_common_mistakes_are_repaired(raw, expected):
+    assert extract_json(raw) == (expected, "repaired")
+
+
+@pytest.mark.parametrize("raw", ["", "   ", "no json here"])
+def test_no_object_is_an_error(raw):
+    with pytest.raises(RuntimeError) as info:
+        extract_json(raw)
+    assert not isinstance(info.value, TruncatedJSON)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    # Complete elements of the open containers are kept
+    ('{"strengths": ["a", "b"], "weaknesses": ["c"', {"strengths": ["a", "b"], "weaknesses": ["c"]}),
+    ('{"strengths": ["a", "b"', {"strengths": ["a", "b"]}),
+    ('{"a": [1, 2], "b": {"c": "d"', {"a": [1, 2], "b": {"c": "d"}}),
+    ('{"a": [], "b": [', {"a": []}),
+    # Cut strings, keys and numbers are dropped
+    ('{"a": "x", "b": "unfinis', {"a": "x"}),
+    ('{"a": "x", "b', {"a": "x"}),
+    ('{"a": "x", "b": 12', {"a": "x"}),
+])
+def test_truncated_object_is_closed_after_its_last_complete_element(raw, expected):
+    assert json.loads(closed(raw)) == expected
+
+
+def test_nothing_complete_is_not_closed():
+    assert closed('{"a": "unfinis') is None
+    assert closed('{"a": 12') is None
+
+
+def test_truncation_keeps_the_partial_text():
+    with pytest.raises(TruncatedJSON) as info:
+        extract_json('Sure! {"a": [1, 2')
+    assert info.value.partial == '{"a": [1, 2'
+
+
+def test_clean_output_is_not_remembered():
+    agent = StubAgent()
+
+    assert runtime.run(parse_agent_json(agent, "p", '{"a": 1}')) == {"a": 1}
+    assert agent.partials == [] and agent.remembered is None
+
+
+def test_truncated_output_is_continued_and_remembered():
+    agent = StubAgent('", "b"], "c": 1}')
+
+    parsed = runtime.run(parse_agent_json(agent, "p", '{"items": ["a'))
+
+    assert parsed == {"items": ["a", "b"], "c": 1}
+    assert agent.partials == ['{"items": ["a']
+    assert agent.remembered == parsed
+    assert json_repair.stats["stub"]["continued"] >= 1
+
+
+def test_restarted_continuation_replaces_the_partial():
+    agent = StubAgent('{"items": ["a", "b"]}')
+
+    assert runtime.run(parse_agent_json(agent, "p", '{"items": ["a')) == {"items": ["a", "b"]}
+
+
+def test_closed_only_when_allowed(monkeypatch):
+    monkeypatch.setattr(json_repair, "LLM_JSON_CONTINUATIONS", 1)
+    raw = '{"strengths": ["a", "b"], "weaknesses": ["c", "d'
+
+    with pytest.raises(TruncatedJSON):
+        runtime.run(parse_agent_json(StubAgent(""), "p", raw))
+
+    agent = StubAgent("")
+    parsed = runtime.run(parse_agent_json(agent, "p", raw, allow_closed=True))
+
+    assert parsed == {"strengths": ["a", "b"], "weaknesses": ["c"]}
+    assert agent.remembered == parsed
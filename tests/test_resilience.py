@@ -0,0 +1,109 @@
+"""
+app.ai.resilience against a local fake provider that injects failures
+(app/ai/fake_llm.py). Run with `python -m pytest tests`.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.ai import resilience
+from app.ai.agent import Agent
+from app.ai.fake_llm import FakeLLM
+from app.runtime import runtime
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    # Fast backoff and small limits; each test gets its own provider URL,
+    # hence its own circuit breaker
+    monkeypatch.setattr(resilience, "LLM_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(resilience, "LLM_BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(resilience, "LLM_BREAKER_RESET", 0.3)
+    monkeypatch.setattr("app.ai.agent.LLM_CACHE_ENABLED", False)
+
+    with FakeLLM(reply="ok") as server:
+        monkeypatch.setenv("LLM_BASE_URL", server.url)
+        monkeypatch.setenv("LLM_API_KEY", "test")
+        yield server
+
+
+def agent(model="fake-model"):
+    return Agent(name="test", model=model, system_prompt="Reply with ok.")
+
+
+def test_retries_5xx_and_429_then_succeeds(fake):
+    fake.fail(503)
+    fake.fail(429, headers={"Retry-After": "0.1"})
+
+    assert runtime.run(agent().run("p")) == "ok"
+    assert fake.requests == 3
+
+
+def test_4xx_is_not_retried(fake):
+    fake.fail(400)
+
+    with pytest.raises(resilience.LLMRequestError):
+        runtime.run(agent().run("p"))
+    assert fake.requests == 1
+
+
+def test_long_retry_after_fails_instead_of_waiting(fake):
+    fake.fail(429, headers={"Retry-After": "3600"})
+
+    started = time.monotonic()
+    with pytest.raises(resilience.LLMRateLimited):
+        runtime.run(agent().run("p"))
+    assert time.monotonic() - started < 1
+
+
+def test_breaker_opens_fails_fast_and_recovers(fake):
+    fake.fail(500, times=resilience.LLM_BREAKER_THRESHOLD)
+
+    # The attempt after the threshold is already refused
+    with pytest.raises(resilience.CircuitOpen):
+        runtime.run(agent().run("p"))
+    sent = fake.requests
+
+    # Open: rejected without reaching the provider
+    with pytest.raises(resilience.CircuitOpen):
+        runtime.run(agent().run("p"))
+    assert fake.requests == sent
+
+    # Half-open after the reset timeout: one probe closes it again
+    time.sleep(0.35)
+    assert runtime.run(agent().run("p")) == "ok"
+    assert resilience.breaker_for(fake.url).state == "closed"
+
+
+def test_retry_budget_bounds_slow_provider(fake, monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_RETRY_BUDGET", 0.5)
+    fake.stall(2, times=resilience.LLM_MAX_RETRIES + 1)
+
+    started = time.monotonic()
+    with pytest.raises(resilience.LLMUnavailable, match="budget"):
+        runtime.run(agent().run("p"))
+    assert time.monotonic() - started < 1.5
+
+
+def test_stream_retries_before_first_fragment(fake):
+    fake.fail(502)
+
+    async def collect():
+        return "".join([part async for part in agent().stream("p")])
+
+    assert runtime.run(collect()) == "ok"
+    assert fake.requests == 2
+
+
+def test_model_concurrency_limit(fake, monkeypatch):
+    monkeypatch.setitem(resilience.LLM_MODEL_LIMITS, "limited-model", 2)
+    fake.latency = 0.1
+
+    async def many():
+        limited = agent("limited-model")
+        return await asyncio.gather(*(limited.run(f"p{i}") for i in range(6)))
+
+    assert runtime.run(many()) == ["ok"] * 6
+    assert fake.max_in_flight == 2
@@ -0,0 +1,148 @@
+"""
+app/sandbox_runner.py run directly, as the pool starts it: escapes
+from the working directory, sockets, processes and the result channel.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from app import sandbox
+from app.runtime import runtime
+
+LIMITS = {"cpuSeconds": 2, "memoryMb": 256, "fileMb": 1, "outputChars": 2000}
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    path = tmp_path / "work"
+    path.mkdir()
+    return path
+
+
+def run(workdir, code, names=()):
+    job = json.dumps({"code": code, "names": list(names)}) + "\n"
+    process = subprocess.run(
+        [sys.executable, "-I", sandbox.RUNNER, json.dumps(LIMITS)],
+        input=job.encode(),
+        capture_output=True,
+        cwd=workdir,
+        timeout=30
+    )
+    return json.loads(process.stdout)
+
+
+def test_passing_run_with_checks(workdir):
+    result = run(workdir, "def add(a, b):\n    return a + b\nprint(add(1, 2))", ["add", "sub"])
+
+    assert result["status"] == "passed"
+    assert result["stdout"] == "3\n"
+    assert [check["passed"] for check in result["checks"]] == [True, False]
+
+
+def test_files_in_workdir_are_allowed(workdir):
+    result = run(workdir, "import os\nopen('a.txt', 'w').write('x')\nprint(os.listdir())")
+
+    assert result["status"] == "passed"
+    assert result["stdout"] == "['a.txt']\n"
+
+
+@pytest.mark.parametrize("code", [
+    "open({target!r}, 'w').write('x')",
+    "import os\nos.write(os.open({target!r}, os.O_WRONLY | os.O_CREAT), b'x')",
+    "import sqlite3\nsqlite3.connect({target!r}).execute('create table t(x)')",
+    "import shutil\nshutil.copyfile('a', {target!r})",
+    "import os\nos.chdir({outside!r})\nopen('outside.txt', 'w')",
+])
+def test_writes_outside_workdir_are_denied(workdir, tmp_path, code):
+    target = tmp_path / "outside.txt"
+    (workdir / "a").write_text("x")
+
+    result = run(workdir, code.format(target=str(target), outside=str(tmp_path)))
+
+    assert result["status"] == "runtime_error"
+    assert "PermissionError" in result["error"]
+    assert not target.exists()
+
+
+@pytest.mark.parametrize("code", [
+    "print(open({secret!r}).read())",
+    "import os\nprint(os.listdir({outside!r}))",
+])
+def test_reads_outside_workdir_are_denied(workdir, tmp_path, code):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("s3cret")
+
+    result = run(workdir, code.format(secret=str(secret), outside=str(tmp_path)))
+
+    assert result["status"] == "runtime_error"
+    assert "s3cret" not in result["stdout"] and "secret.txt" not in result["stdout"]
+
+
+@pytest.mark.parametrize("code", [
+    "import socket\nsocket.socket()",
+    "import socket\nsocket.create_connection(('127.0.0.1', 80))",
+    "import subprocess\nsubprocess.run(['true'])",
+    "import os\nos.system('true')",
+    "import os\nos.fork()",
+    "import _posixsubprocess",
+    "import ctypes\nctypes.CDLL(None)",
+    "(lambda: 0).__code__.replace(co_consts=())",
+])
+def test_sockets_processes_and_native_code_are_denied(workdir, code):
+    result = run(workdir, code)
+
+    assert result["status"] == "runtime_error"
+    assert "not allowed" in result["error"]
+
+
+def test_forged_report_is_reduced_to_its_shape(workdir):
+    forged = {
+        "status": "passed", "stdout": "x" * 10000, "error": None, "line": None,
+        "defined": ["add", "extra"], "durationMs": 1,
+        "checks": [{"check": "all tests", "passed": True}]
+    }
+    code = (
+        "import os, json\n"
+        f"report = json.dumps({forged!r}).encode()\n"
+        "for fd in range(3, 20):\n"
+        "    try:\n"
+        "        os.write(fd, report)\n"
+        "    except OSError:\n"
+        "        pass\n"
+        "os.write(1, b'{\"status\": \"passed\"}')\n"
+        "os._exit(0)"
+    )
+
+    result = run(workdir, code, ["add"])
+
+    # Only what a run could report: known names, bounded output
+    assert [check["check"] for check in result["checks"]] == ["defines add"]
+    assert len(result["stdout"]) < 2100
+
+
+def test_cpu_limit_is_a_timeout(workdir):
+    result = run(workdir, "while True:\n    pass")
+
+    assert result["status"] == "timeout"
+
+
+def test_grading_is_refused_without_isolation(monkeypatch):
+    monkeypatch.setattr(sandbox, "SANDBOX_ENABLED", True)
+    monkeypatch.setattr(sandbox, "SANDBOX_REQUIRE_ISOLATION", True)
+    monkeypatch.setattr(sandbox, "SANDBOX_USER", "")
+    monkeypatch.setattr(sandbox.sandbox_pool, "_isolation", False)
+
+    assert runtime.run(sandbox.grade("", "print(1)")) is None
+    assert sandbox.sandbox_pool.snapshot()["grading"] is False
+
+
+def test_extract_and_detect():
+    answer = "Here is my solution:\n\n```python\ndef add(a, b):\n    return a + b\n```\n\nThanks."
+
+    assert sandbox.extract_code(answer).strip() == "def add(a, b):\n    return a + b"
+    assert sandbox.detect_language("", "import json\nconfig = {\n    'a': 1,\n}\n") == "python"
+    assert sandbox.detect_language("", "import java.util.*;\nclass A {\n}") is None
+    assert sandbox.derive_checks("Write add() with str.split() and __init__()") == ["add"]
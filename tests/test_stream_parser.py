@@ -0,0 +1,86 @@
+"""
+app.ai.stream_parser.PlanStreamParser fed a streamed plan in fragments.
+"""
+
+import json
+
+import pytest
+
+from app.ai.stream_parser import PlanStreamParser
+
+PLAN = {
+    "internship": {"title": "Backend {intern}", "summary": 'Say "hi" to the team \\ then start'},
+    "weekly_plans": [
+        {"week_number": 1, "goals": ["Set up [env]", "Read \"docs\""]},
+        {"week_number": 2, "goals": []},
+    ],
+    "tasks": [
+        {"week_number": 1, "title": "Write a parser", "description": "Handle } and ] in strings"},
+        {"week_number": 2, "title": "Ship {it}", "resources": [{"url": "https://x/?a=[1]"}]},
+    ],
+}
+
+
+def fenced(plan):
+    return "```json\n" + json.dumps(plan, indent=2) + "\n```"
+
+
+def feed(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def expected_events(plan):
+    return (
+        [("internship", plan["internship"])]
+        + [("week", week) for week in plan["weekly_plans"]]
+        + [("task", task) for task in plan["tasks"]]
+    )
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100000])
+def test_fenced_plan_in_fragments(size):
+    text = fenced(PLAN)
+    parser = PlanStreamParser()
+
+    events = feed(parser, (text[i:i + size] for i in range(0, len(text), size)))
+
+    assert events == expected_events(PLAN)
+    assert parser.done
+
+
+def test_events_arrive_as_soon_as_each_element_closes():
+    text = json.dumps(PLAN)
+    parser = PlanStreamParser()
+    first_week_end = text.index('"week_number": 2') - 1
+
+    events = feed(parser, text[:first_week_end])
+
+    assert [kind for kind, _ in events] == ["internship", "week"]
+    assert not parser.done
+
+
+def test_nothing_is_parsed_after_the_plan_closes():
+    parser = PlanStreamParser()
+
+    events = feed(parser, json.dumps(PLAN) + '\n```\n{"internship": {}}')
+
+    assert events == expected_events(PLAN)
+    assert parser.feed('{"tasks": [{}]}') == []
+
+
+def test_other_keys_produce_no_events():
+    plan = {"notes": {"a": [{"b": 1}]}, "weekly_plans": [{"week_number": 1}]}
+
+    assert feed(PlanStreamParser(), json.dumps(plan)) == [("week", {"week_number": 1})]
+
+
+def test_truncated_plan_is_not_done():
+    text = json.dumps(PLAN)
+    parser = PlanStreamParser()
+
+    feed(parser, text[:-5])
+
+    assert not parser.done